@@ -1,5 +1,6 @@
 import logging
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any
 
 import uvicorn
@@ -56,6 +57,11 @@ def get_service(name: str):
 async def startup_event():
     """应用启动事件"""
     logger.info("WaveShift TTS Engine API 启动中...")
+    # asyncio.to_thread 使用默认线程池，R2下载等阻塞I/O需足够的线程并发执行
+    io_workers = getattr(config, 'IO_THREAD_WORKERS', 16)
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="io")
+    )
 
 
 @app.on_event("shutdown")
@@ -65,6 +71,12 @@ async def shutdown_event():
     if task_manager:
         await task_manager.close()
         logger.info("任务管理器已关闭")
+    
+    # 关闭共享的Cloudflare客户端连接池
+    client_manager = services.get('client_manager')
+    if client_manager:
+        await client_manager.close_all()
+        logger.info("Cloudflare客户端已关闭")
 
 
 @app.post("/api/start_tts")
@@ -203,7 +215,7 @@ async def debug_task_data(task_id: str):
         return JSONResponse(content={
             'task_id': task_id,
             'segments_count': len(sentences),
-            'media_paths': media_paths,
+            'media_paths': media_paths._asdict() if media_paths else {},
             'first_segment': {
                 'sequence': sentences[0].sequence if sentences else None,
                 'speaker': sentences[0].speaker if sentences else None,
@@ -63,6 +63,13 @@ class CloudflareConfig:
     r2_access_key_id: str = field(default_factory=lambda: os.getenv("CLOUDFLARE_R2_ACCESS_KEY_ID", ""))
     r2_secret_access_key: str = field(default_factory=lambda: os.getenv("CLOUDFLARE_R2_SECRET_ACCESS_KEY", ""))
     r2_bucket_name: str = field(default_factory=lambda: os.getenv("CLOUDFLARE_R2_BUCKET_NAME", ""))
+    max_connections: int = field(default_factory=lambda: int(os.getenv("CLOUDFLARE_MAX_CONNECTIONS", "100")))
+    d1_cache_ttl: float = field(default_factory=lambda: float(os.getenv("D1_CACHE_TTL", "5.0")))
+    r2_upload_concurrency: int = field(default_factory=lambda: int(os.getenv("R2_UPLOAD_CONCURRENCY", "16")))
+    r2_write_rate: float = field(default_factory=lambda: float(os.getenv("R2_WRITE_RATE", "800")))
+    r2_write_burst: float = field(default_factory=lambda: float(os.getenv("R2_WRITE_BURST", "200")))
+    r2_media_cache_mb: int = field(default_factory=lambda: int(os.getenv("R2_MEDIA_CACHE_MB", "10240")))
+    max_concurrent_fetches: int = field(default_factory=lambda: int(os.getenv("MAX_CONCURRENT_FETCHES", "2")))
     
     def __post_init__(self):
         """验证Cloudflare配置"""
@@ -187,6 +194,7 @@ class RuntimeConfig:
     simplification_batch_size: int = field(default_factory=lambda: int(os.getenv("SIMPLIFICATION_BATCH_SIZE", "50")))
     tts_batch_size: int = field(default_factory=lambda: int(os.getenv("TTS_BATCH_SIZE", "3")))
     max_parallel_segments: int = field(default_factory=lambda: int(os.getenv("MAX_PARALLEL_SEGMENTS", "2")))
+    io_thread_workers: int = field(default_factory=lambda: int(os.getenv("IO_THREAD_WORKERS", "16")))
     
     # 资源配置
     simplifier_actor_num_cpus: float = field(default_factory=lambda: float(os.getenv("SIMPLIFIER_ACTOR_NUM_CPUS", "0.5")))
@@ -241,6 +249,13 @@ class AppConfig:
             'CLOUDFLARE_R2_ACCESS_KEY_ID': self.cloudflare.r2_access_key_id,
             'CLOUDFLARE_R2_SECRET_ACCESS_KEY': self.cloudflare.r2_secret_access_key,
             'CLOUDFLARE_R2_BUCKET_NAME': self.cloudflare.r2_bucket_name,
+            'CLOUDFLARE_MAX_CONNECTIONS': self.cloudflare.max_connections,
+            'D1_CACHE_TTL': self.cloudflare.d1_cache_ttl,
+            'R2_UPLOAD_CONCURRENCY': self.cloudflare.r2_upload_concurrency,
+            'R2_WRITE_RATE': self.cloudflare.r2_write_rate,
+            'R2_WRITE_BURST': self.cloudflare.r2_write_burst,
+            'R2_MEDIA_CACHE_MB': self.cloudflare.r2_media_cache_mb,
+            'MAX_CONCURRENT_FETCHES': self.cloudflare.max_concurrent_fetches,
             
             # 音频配置
             'BATCH_SIZE': self.audio.batch_size,
@@ -273,6 +288,7 @@ class AppConfig:
             'TTS_BATCH_SIZE': self.runtime.tts_batch_size,
             'SIMPLIFICATION_BATCH_SIZE': self.runtime.simplification_batch_size,
             'MAX_PARALLEL_SEGMENTS': self.runtime.max_parallel_segments,
+            'IO_THREAD_WORKERS': self.runtime.io_thread_workers,
             'SIMPLIFIER_ACTOR_NUM_CPUS': self.runtime.simplifier_actor_num_cpus,
             'MEDIA_MIXER_ACTOR_NUM_CPUS': self.runtime.media_mixer_actor_num_cpus,
             
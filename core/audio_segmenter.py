@@ -1,8 +1,13 @@
-import re
+import os
+import struct
 import logging
 import asyncio
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, AsyncIterator
+
+import numpy as np
+import soundfile as sf
 
 try:
     from pydub import AudioSegment
@@ -16,6 +21,119 @@ from utils.path_manager import PathManager
 
 logger = logging.getLogger(__name__)
 
+
+@lru_cache(maxsize=32)
+def _fade_ramp(fade_frames: int) -> np.ndarray:
+    """线性淡入增益曲线（按帧数缓存，淡出时反向使用）"""
+    ramp = np.linspace(0.0, 1.0, fade_frames, dtype=np.float32)[:, np.newaxis]
+    ramp.setflags(write=False)
+    return ramp
+
+
+def _apply_fade(segment: np.ndarray, fade_frames: int, fade_in: bool) -> None:
+    """在 (帧数, 声道) 形状的 int16 片段上原地应用线性淡入/淡出"""
+    fade_frames = min(fade_frames, len(segment))
+    if fade_frames <= 0:
+        return
+    if fade_in:
+        view = segment[:fade_frames]
+        ramp = _fade_ramp(fade_frames)
+    else:
+        view = segment[-fade_frames:]
+        ramp = _fade_ramp(fade_frames)[::-1]
+    np.multiply(view, ramp, out=view, casting='unsafe')
+
+
+def _load_audio_samples(audio_path: str) -> Tuple[np.ndarray, int]:
+    """解码音频文件为只读的 (帧数, 声道) int16 数组
+    
+    Returns:
+        Tuple[np.ndarray, int]: (PCM采样, 采样率)
+    """
+    # 按文件头探测格式而非扩展名：未分离时 original_audio.wav 实际可能是AAC等压缩格式
+    try:
+        info = sf.info(audio_path)
+    except Exception:
+        info = None
+    
+    if info is not None:
+        # libsndfile 可识别的格式（人声分离输出为 float WAV）直接解码，无需启动 ffmpeg 子进程
+        if info.subtype == 'PCM_16':
+            samples, frame_rate = sf.read(audio_path, dtype='int16', always_2d=True)
+        else:
+            # libsndfile 读取浮点文件为整型时不做缩放，需先读为 float32 再量化
+            float_samples, frame_rate = sf.read(audio_path, dtype='float32', always_2d=True)
+            np.clip(float_samples, -1.0, 1.0, out=float_samples)
+            np.multiply(float_samples, 32767.0, out=float_samples)
+            samples = float_samples.astype(np.int16)
+            del float_samples
+        samples.setflags(write=False)
+        return samples, frame_rate
+    
+    audio = AudioSegment.from_file(audio_path)
+    # 统一为16位采样，便于按 int16 直接操作原始PCM
+    if audio.sample_width != 2:
+        audio = audio.set_sample_width(2)
+    samples = np.frombuffer(audio.raw_data, dtype=np.int16).reshape(-1, audio.channels)
+    return samples, audio.frame_rate
+
+
+def _peak_gain(samples: np.ndarray, headroom_db: float = 0.1) -> float:
+    """计算将 int16 采样峰值标准化到满幅下 headroom_db 分贝所需的增益（与 pydub normalize 一致）"""
+    if samples.size == 0:
+        return 1.0
+    # 分别取最大/最小值，避免 np.abs 在 -32768 上溢出及额外分配
+    peak = max(int(samples.max()), -int(samples.min()))
+    if peak == 0:
+        return 1.0
+    return 32768 * 10 ** (-headroom_db / 20) / peak
+
+
+def _write_wav(output_path: str, samples: np.ndarray, frame_rate: int) -> None:
+    """将 (帧数, 声道) 形状的 int16 采样直接写为PCM WAV文件（44字节文件头 + 原始数据）"""
+    channels = samples.shape[1]
+    data_size = samples.nbytes
+    header = (
+        b'RIFF' + struct.pack('<I', 36 + data_size) + b'WAVE'
+        + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, channels, frame_rate,
+                                frame_rate * channels * 2, channels * 2, 16)
+        + b'data' + struct.pack('<I', data_size)
+    )
+    with open(output_path, 'wb') as f:
+        f.write(header)
+        f.write(np.ascontiguousarray(samples, dtype='<i2').data)
+
+
+def _render_clip(output_path: str, samples: np.ndarray, frame_rate: int,
+                 frame_ranges: List[List[int]], indices: List[int], needs_fade: List[bool],
+                 last_index: int, fade_frames: int, half_fade_frames: int,
+                 total_frames: int, gain: float) -> None:
+    """将多个源音频区间拼接到预分配缓冲区，应用淡入淡出和统一增益后写为WAV"""
+    combined = np.empty((total_frames, samples.shape[1]), dtype=np.int16)
+    write_ptr = 0
+    for i, (start, end) in zip(indices, frame_ranges):
+        segment = combined[write_ptr:write_ptr + end - start]
+        segment[:] = samples[start:end]
+        # 在输出缓冲区上原地应用淡入淡出
+        if needs_fade[i]:
+            if i == 0:
+                # 第一个segment：在开头应用淡入
+                _apply_fade(segment, fade_frames, True)
+            if i == last_index:
+                # 最后一个segment：在结尾应用淡出
+                _apply_fade(segment, fade_frames, False)
+            else:
+                # 中间的segments：两端都进行轻微的淡入淡出以确保平滑
+                _apply_fade(segment, half_fade_frames, True)
+                _apply_fade(segment, half_fade_frames, False)
+        write_ptr += end - start
+    
+    # 在缓冲区上应用统一增益，然后直接写出WAV（无需经由 AudioSegment 编码）
+    if gain != 1.0:
+        np.multiply(combined, gain, out=combined, casting='unsafe')
+    _write_wav(output_path, combined, frame_rate)
+
+
 class AudioSegmenter:
     """音频切分服务 - 基于说话人分组的智能音频切片"""
     
@@ -35,133 +153,101 @@ class AudioSegmenter:
             
         self.logger.info("音频切分服务初始化完成")
     
-    def _time_str_to_ms(self, time_str: str) -> int:
-        """时间字符串转毫秒的辅助函数"""
-        match = re.match(r'(\d+)m(\d+)s(\d+)ms', time_str)
-        if not match: 
-            return 0
-        m, s, ms = map(int, match.groups())
-        return m * 60 * 1000 + s * 1000 + ms
-    
-    def _ms_to_time_str(self, ms: float) -> str:
-        """毫秒转时间字符串的辅助函数"""
-        ms_int = int(ms)  # 转换为整数
-        minutes = ms_int // 60000
-        seconds = (ms_int % 60000) // 1000
-        milliseconds = ms_int % 1000
-        return f"{minutes}m{seconds}s{milliseconds}ms"
-    
-    def _sentences_to_transcript_data(self, sentences: List[Sentence]) -> List[Dict]:
-        """将Sentence对象转换为外部audio.py需要的格式"""
-        transcript_data = []
-        for sentence in sentences:
-            transcript_data.append({
+    def _create_audio_clips(self, sentences: List[Sentence]) -> Tuple[Dict, List[Optional[str]]]:
+        """根据句子列表创建音频切片计划（支持padding过渡）
+        
+        Returns:
+            Tuple[Dict, List[Optional[str]]]: (切片库, 按输入位置索引的clip_id列表，未分配切片的句子为None)
+        """
+        n = len(sentences)
+        sentence_clip_ids: List[Optional[str]] = [None] * n
+        if n == 0:
+            return {}, sentence_clip_ids
+        
+        # 一次性将时间戳整理为数组（SoA），循环内不再逐个访问属性或解析时间字符串
+        starts = np.fromiter((s.start_ms for s in sentences), dtype=np.float64, count=n).astype(np.int64)
+        ends = np.fromiter((s.end_ms for s in sentences), dtype=np.float64, count=n).astype(np.int64)
+        
+        # 向量化计算padding后的区间：开头减去padding（不小于0），结尾加上padding
+        padded_starts = np.maximum(starts - self.padding_ms, 0)
+        padded_ends = ends + self.padding_ms
+        durations = padded_ends - padded_starts
+        
+        starts_list, ends_list = starts.tolist(), ends.tolist()
+        padded_starts_list, padded_ends_list = padded_starts.tolist(), padded_ends.tolist()
+        durations_list = durations.tolist()
+        
+        kept = np.flatnonzero(durations > 0)
+        if len(kept) == 0:
+            return {}, sentence_clip_ids
+        kept_list = kept.tolist()
+        
+        items = []
+        for i in kept_list:
+            sentence = sentences[i]
+            items.append({
                 'sequence': sentence.sequence,
-                'start': self._ms_to_time_str(sentence.start_ms),
-                'end': self._ms_to_time_str(sentence.end_ms),
                 'speaker': sentence.speaker,
                 'original': sentence.original_text,
                 'translation': sentence.translated_text,
-                'content_type': 'speech'  # 假设所有句子都是speech类型
+                'original_segment': [starts_list[i], ends_list[i]],  # 原始时间段
+                'padded_segment': [padded_starts_list[i], padded_ends_list[i]],  # 带padding的时间段
+                'segment_duration': durations_list[i]
             })
-        return transcript_data
-    
-    def _create_audio_clips(self, transcript_data: List[Dict]) -> Tuple[Dict, Dict]:
-        """根据转录数据创建音频切片计划（支持padding过渡）"""
-        # 预处理：只处理speech类型的内容
-        sentences = []
-        for item in transcript_data:
-            if item.get('content_type') != 'speech':
-                continue
-            
-            start_ms = self._time_str_to_ms(item['start'])
-            end_ms = self._time_str_to_ms(item['end'])
-            
-            # 添加padding：开头减去padding，结尾加上padding
-            padded_start = max(0, start_ms - self.padding_ms)
-            padded_end = end_ms + self.padding_ms
-            
-            item['original_segment'] = [start_ms, end_ms]  # 保存原始时间段
-            item['padded_segment'] = [padded_start, padded_end]  # 带padding的时间段
-            item['segment_duration'] = padded_end - padded_start
-            
-            if item['segment_duration'] > 0:
-                sentences.append(item)
-
-        if not sentences:
-            return {}, {}
-
-        # 识别同说话人连续块
-        large_blocks = []
-        if sentences:
-            current_block = [sentences[0]]
-            for i in range(1, len(sentences)):
-                current_sentence = sentences[i]
-                last_sentence = current_block[-1]
-                
-                # 检查说话人是否相同
-                same_speaker = current_sentence['speaker'] == last_sentence['speaker']
-                
-                # 检查序列是否连续，或者如果允许跨越非speech，则检查中间是否有非speech片段
-                if same_speaker:
-                    if self.allow_cross_non_speech:
-                        # 允许跨越非speech片段，直接检查说话人相同即可
-                        current_block.append(current_sentence)
-                    else:
-                        # 不允许跨越非speech片段，需要检查序列是否严格连续
-                        if current_sentence['sequence'] == last_sentence['sequence'] + 1:
-                            current_block.append(current_sentence)
-                        else:
-                            # 序列不连续，说明中间有非speech片段，开始新块
-                            large_blocks.append(current_block)
-                            current_block = [current_sentence]
-                else:
-                    large_blocks.append(current_block)
-                    current_block = [current_sentence]
-            large_blocks.append(current_block)
+        
+        # 识别同说话人连续块：说话人变化（或不允许跨越非speech时序列不连续）处即为块边界
+        speaker_ids: Dict[str, int] = {}
+        speakers = np.fromiter(
+            (speaker_ids.setdefault(item['speaker'], len(speaker_ids)) for item in items),
+            dtype=np.int64, count=len(items)
+        )
+        is_boundary = speakers[1:] != speakers[:-1]
+        if not self.allow_cross_non_speech:
+            # 序列不连续，说明中间有非speech片段，开始新块
+            sequences = np.fromiter((item['sequence'] for item in items), dtype=np.int64, count=len(items))
+            is_boundary |= sequences[1:] != sequences[:-1] + 1
+        block_starts = np.concatenate(([0], np.flatnonzero(is_boundary) + 1))
+        block_bounds = np.append(block_starts, len(items)).tolist()
+        large_blocks = [items[block_bounds[k]:block_bounds[k + 1]] for k in range(len(block_starts))]
+        # 各块总时长一次求出
+        block_durations = np.add.reduceat(durations[kept], block_starts).tolist()
 
         # 简化的逻辑：每个large_blocks生成一个clip
         clips_library = {}
-        sentence_to_clip_id_map = {}
         clip_id_counter = 0
 
-        for block in large_blocks:
-            block_total_duration = sum(s['segment_duration'] for s in block)
-            
+        for k, (block, block_total_duration) in enumerate(zip(large_blocks, block_durations)):
             # 只处理总时长大于等于min_duration_ms的块
             if block_total_duration >= self.min_duration_ms:
                 clip_id_counter += 1
                 clip_id = f"Clip_{clip_id_counter}"
                 
                 # 如果总时长超过goal_duration_ms，需要截取前goal_duration_ms的音频
-                if block_total_duration > self.goal_duration_ms:
-                    # 计算需要截取的句子
-                    accumulated_duration = 0
-                    sentences_to_include = []
-                    
-                    for sentence in block:
-                        if accumulated_duration + sentence['segment_duration'] <= self.goal_duration_ms:
-                            sentences_to_include.append(sentence)
-                            accumulated_duration += sentence['segment_duration']
-                        else:
-                            # 添加部分句子以达到goal_duration_ms
-                            remaining_duration = self.goal_duration_ms - accumulated_duration
-                            if remaining_duration > 0:
-                                # 创建截取的句子副本
-                                truncated_sentence = sentence.copy()
-                                # 调整截取句子的segment_duration
-                                truncated_sentence['segment_duration'] = remaining_duration
-                                # 调整padded_segment的结束时间
-                                start_time = truncated_sentence['padded_segment'][0]
-                                truncated_sentence['padded_segment'] = [start_time, start_time + remaining_duration]
-                                sentences_to_include.append(truncated_sentence)
+                needs_truncation = block_total_duration > self.goal_duration_ms
+                accumulated_duration = 0
+                final_sentences = []
+                
+                for sentence in block:
+                    reached_goal = (needs_truncation and
+                                    accumulated_duration + sentence['segment_duration'] > self.goal_duration_ms)
+                    if reached_goal:
+                        # 添加部分句子以达到goal_duration_ms
+                        remaining_duration = self.goal_duration_ms - accumulated_duration
+                        if remaining_duration <= 0:
                             break
+                        # 创建截取的句子副本，调整segment_duration与padded_segment的结束时间
+                        sentence = sentence.copy()
+                        sentence['segment_duration'] = remaining_duration
+                        start_time = sentence['padded_segment'][0]
+                        sentence['padded_segment'] = [start_time, start_time + remaining_duration]
                     
-                    final_sentences = sentences_to_include
-                else:
-                    final_sentences = block
+                    final_sentences.append(sentence)
+                    accumulated_duration += sentence['segment_duration']
+                    
+                    if reached_goal:
+                        break
                 
-                # 合并重叠的segments
+                # 合并重叠的segments（句子开始时间不保证单调，需先排序）
                 merged_segments = self._merge_overlapping_segments(final_sentences)
                 
                 clips_library[clip_id] = {
@@ -178,38 +264,33 @@ class AudioSegmenter:
                 }
                 
                 # 为所有原始句子映射clip_id（包括未截取的部分）
-                for sentence in block:
-                    sentence_to_clip_id_map[sentence['sequence']] = clip_id
+                for i in kept_list[block_bounds[k]:block_bounds[k + 1]]:
+                    sentence_clip_ids[i] = clip_id
 
-        return clips_library, sentence_to_clip_id_map
+        return clips_library, sentence_clip_ids
     
     def _merge_overlapping_segments(self, block: List[Dict]) -> List[List[int]]:
         """合并重叠的segments，确保平滑过渡"""
         if not block:
             return []
         
-        segments = []
-        for sentence in block:
-            segments.append(sentence['padded_segment'])
+        segments = np.array([sentence['padded_segment'] for sentence in block], dtype=np.int64)
         
-        # 按开始时间排序
-        segments.sort(key=lambda x: x[0])
+        # 按开始时间稳定排序（argsort 取代带 lambda 的列表排序）
+        order = np.argsort(segments[:, 0], kind='stable')
+        starts = segments[order, 0]
+        ends = segments[order, 1]
         
-        merged = [segments[0]]
-        for current in segments[1:]:
-            last = merged[-1]
-            
-            # 如果当前segment与上一个重叠，合并它们
-            if current[0] <= last[1]:
-                merged[-1] = [last[0], max(last[1], current[1])]
-            else:
-                merged.append(current)
+        # 当前segment的开始晚于此前所有segment的最远结束时间时，开始新的合并区间
+        reach = np.maximum.accumulate(ends)
+        group_starts = np.concatenate(([0], np.flatnonzero(starts[1:] > reach[:-1]) + 1))
+        merged = np.column_stack((starts[group_starts], np.maximum.reduceat(ends, group_starts)))
         
-        return merged
+        return merged.tolist()
     
     async def _extract_and_save_audio_clips(self, audio_path: str, clips_library: Dict, 
-                                          output_dir: str) -> Dict[str, str]:
-        """并行版本的音频切片提取"""
+                                          output_dir: str) -> AsyncIterator[Tuple[str, Optional[str]]]:
+        """并行版本的音频切片提取，按完成顺序逐个产出 (clip_id, 文件路径)，失败时路径为None"""
         # 创建输出目录
         output_path = Path(output_dir)
         output_path.mkdir(parents=True, exist_ok=True)
@@ -217,63 +298,58 @@ class AudioSegmenter:
         # 异步加载音频文件
         self.logger.info(f"🎵 加载音频文件: {audio_path}")
         try:
-            audio = await asyncio.to_thread(AudioSegment.from_file, audio_path)
+            samples, frame_rate = await asyncio.to_thread(_load_audio_samples, audio_path)
+            audio_len_ms = len(samples) * 1000 // frame_rate
+            # 按整段源音频的峰值计算统一增益，所有切片使用相同增益，响度保持一致
+            global_gain = await asyncio.to_thread(_peak_gain, samples)
         except Exception as e:
             self.logger.error(f"❌ 加载音频文件失败: {e}")
-            return {}
+            for clip_id in clips_library:
+                yield clip_id, None
+            return
+        
+        # 并行处理所有切片，CPU密集部分按核数限制并发
+        render_sem = asyncio.Semaphore(os.cpu_count() or 4)
         
-        # 并行处理所有切片
         async def process_single_clip(clip_id: str, clip_info: Dict) -> Tuple[str, Optional[str]]:
             """处理单个音频切片"""
             try:
                 padding_ms = clip_info['padding_ms']
                 self.logger.info(f"🎬 处理 {clip_id}: {clip_info['speaker']} ({clip_info['total_duration_ms']/1000:.1f}秒) [padding: {padding_ms}ms]")
                 
-                # 合并所有片段，使用padding进行平滑过渡
-                combined_audio = AudioSegment.empty()
-                segments_to_process = clip_info['segments_to_concatenate']
-                
-                for i, (start_ms, end_ms) in enumerate(segments_to_process):
-                    # 边界检查
-                    if start_ms < 0:
-                        start_ms = 0
-                    if end_ms > len(audio):
-                        end_ms = len(audio)
-                    if start_ms >= end_ms:
-                        continue
-                        
-                    segment = audio[start_ms:end_ms]
-                    
-                    # 使用padding实现平滑过渡
-                    if len(segment) > padding_ms * 2:
-                        # 为了避免突然的开始和结束，在padding区域应用淡入淡出
-                        fade_duration = min(padding_ms // 2, 100)  # 淡入淡出时长
-                        
-                        if i == 0:
-                            # 第一个segment：在开头应用淡入
-                            segment = segment.fade_in(fade_duration)
-                        
-                        if i == len(segments_to_process) - 1:
-                            # 最后一个segment：在结尾应用淡出
-                            segment = segment.fade_out(fade_duration)
-                        else:
-                            # 中间的segments：两端都进行轻微的淡入淡出以确保平滑
-                            segment = segment.fade_in(fade_duration // 2).fade_out(fade_duration // 2)
-                    
-                    combined_audio += segment
-                
-                if len(combined_audio) == 0:
+                # 一次性完成边界裁剪与毫秒→帧下标换算，再写入预分配的缓冲区
+                segments_ms = np.clip(
+                    np.asarray(clip_info['segments_to_concatenate'], dtype=np.int64).reshape(-1, 2),
+                    0, audio_len_ms
+                )
+                frames = segments_ms * frame_rate // 1000
+                # 裁剪后为空的片段跳过（保留原始下标以判断首/尾片段）
+                valid = np.flatnonzero(segments_ms[:, 0] < segments_ms[:, 1])
+                total_frames = int((frames[valid, 1] - frames[valid, 0]).sum())
+                if total_frames == 0:
                     self.logger.warning(f"   ⚠️ {clip_id} 片段为空，跳过")
                     return clip_id, None
                 
+                # 使用padding实现平滑过渡：仅对长于两倍padding的片段在padding区域应用淡入淡出
+                needs_fade = ((segments_ms[:, 1] - segments_ms[:, 0]) > padding_ms * 2).tolist()
+                fade_duration = min(padding_ms // 2, 100)  # 淡入淡出时长
+                fade_frames = fade_duration * frame_rate // 1000
+                half_fade_frames = (fade_duration // 2) * frame_rate // 1000
+                last_index = len(segments_ms) - 1
+                
                 # 保存音频片段
                 speaker_name = clip_info['speaker'].replace(' ', '_').replace('/', '_')
                 clip_filename = f"{clip_id}_{speaker_name}.wav"
                 clip_filepath = output_path / clip_filename
                 
-                # 添加最终的音频标准化并异步保存
-                combined_audio = combined_audio.normalize()
-                await asyncio.to_thread(combined_audio.export, str(clip_filepath), format="wav")
+                # 拼接、淡入淡出、增益与写盘在同一次线程跳转中完成；numpy大数组运算释放GIL，
+                # 多个切片可在多核上并行，信号量限制同时处理的切片数
+                async with render_sem:
+                    await asyncio.to_thread(
+                        _render_clip, str(clip_filepath), samples, frame_rate,
+                        frames[valid].tolist(), valid.tolist(), needs_fade, last_index,
+                        fade_frames, half_fade_frames, total_frames, global_gain
+                    )
                 
                 self.logger.info(f"   ✅ 已保存: {clip_filepath}")
                 return clip_id, str(clip_filepath)
@@ -282,49 +358,114 @@ class AudioSegmenter:
                 self.logger.error(f"处理切片 {clip_id} 失败: {e}")
                 return clip_id, None
         
-        # 并行执行所有切片处理
+        # 并行执行所有切片处理，每个切片写盘完成即产出
         self.logger.info(f"🚀 开始并行处理 {len(clips_library)} 个音频切片")
-        tasks = [process_single_clip(clip_id, clip_info) for clip_id, clip_info in clips_library.items()]
-        results = await asyncio.gather(*tasks)
-        
-        # 收集成功的结果
-        clip_files = {clip_id: filepath for clip_id, filepath in results if filepath}
+        tasks = [asyncio.create_task(process_single_clip(clip_id, clip_info))
+                 for clip_id, clip_info in clips_library.items()]
+        saved_count = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                clip_id, filepath = await next_done
+                if filepath:
+                    saved_count += 1
+                yield clip_id, filepath
+        finally:
+            # 消费方提前退出时取消尚未完成的切片任务
+            for task in tasks:
+                task.cancel()
         
-        self.logger.info(f"✅ 并行处理完成，成功生成 {len(clip_files)} 个音频切片")
-        return clip_files
+        self.logger.info(f"✅ 并行处理完成，成功生成 {saved_count} 个音频切片")
     
-    def _map_clips_to_sentences(self, sentences: List[Sentence], clips_library: Dict, 
-                              clip_files: Dict, sentence_to_clip_id_map: Dict) -> List[Sentence]:
-        """将切片映射回句子对象"""
-        updated_sentences = []
+    async def iter_segmented_sentences(self, task_id: str, audio_file_path: str,
+                                       sentences: List[Sentence], path_manager=None) -> AsyncIterator[Tuple[int, Sentence]]:
+        """
+        流式音频切片：每个切片的WAV写入磁盘后立即产出其对应的句子
         
-        for sentence in sentences:
-            # 获取句子对应的clip_id
-            clip_id = sentence_to_clip_id_map.get(sentence.sequence)
+        Args:
+            task_id: 任务ID
+            audio_file_path: 音频文件路径
+            sentences: 句子列表
+            path_manager: 共享的路径管理器（可选）
             
-            if clip_id and clip_id in clip_files:
-                # 更新句子的音频路径
-                sentence.audio = clip_files[clip_id]
-                
-                # 获取clip信息
-                clip_info = clips_library[clip_id]
-                
-                # 计算实际的音频时长（用于语音克隆参考）
-                sentence.speech_duration = clip_info['total_duration_ms'] / 1000.0
-                
-                self.logger.debug(f"句子 {sentence.sequence} 映射到切片 {clip_id}")
+        Yields:
+            Tuple[int, Sentence]: (句子在输入列表中的索引, 更新了音频路径的句子)，按切片完成顺序
+        """
+        self.logger.info(f"[{task_id}] 开始为 {len(sentences)} 个句子进行智能音频切片")
+        
+        # 生成切片计划
+        clips_library, sentence_clip_ids = self._create_audio_clips(sentences)
+        
+        if not clips_library:
+            self.logger.warning(f"[{task_id}] 未能生成有效的音频切片")
+            for i, sentence in enumerate(sentences):
+                yield i, sentence
+            return
+        
+        self.logger.info(f"[{task_id}] 生成了 {len(clips_library)} 个音频切片")
+        
+        # 按切片归组句子索引，切片完成时一次产出其全部句子；
+        # 未映射到切片的句子不依赖任何切片，立即产出，按序消费时不会被拖到最后
+        clip_members: Dict[str, List[int]] = {}
+        for i, clip_id in enumerate(sentence_clip_ids):
+            if clip_id:
+                clip_members.setdefault(clip_id, []).append(i)
             else:
-                self.logger.warning(f"句子 {sentence.sequence} 未找到对应的音频切片")
-            
-            updated_sentences.append(sentence)
+                self.logger.warning(f"句子 {sentences[i].sequence} 未找到对应的音频切片")
+                yield i, sentences[i]
+        
+        # 使用传入的path_manager，如果没有则创建新的（向后兼容）
+        if path_manager is None:
+            path_manager = PathManager(task_id)
+            self.logger.warning(f"[{task_id}] AudioSegmenter: 未传入path_manager，创建新的临时目录")
         
-        return updated_sentences
+        audio_clips_dir = path_manager.temp.audio_prompts_dir
+        
+        # 提取并保存音频切片，映射切片到句子
+        debug_enabled = self.logger.isEnabledFor(logging.DEBUG)
+        async for clip_id, clip_path in self._extract_and_save_audio_clips(
+            audio_file_path, clips_library, str(audio_clips_dir)
+        ):
+            for i in clip_members.get(clip_id, ()):
+                sentence = sentences[i]
+                if clip_path:
+                    # 更新句子的音频路径，并记录实际的音频时长（用于语音克隆参考）
+                    sentence.audio = clip_path
+                    sentence.speech_duration = clips_library[clip_id]['total_duration_ms'] / 1000.0
+                    if debug_enabled:
+                        self.logger.debug(f"句子 {sentence.sequence} 映射到切片 {clip_id}")
+                else:
+                    self.logger.warning(f"句子 {sentence.sequence} 未找到对应的音频切片")
+                yield i, sentence
+    
+    async def iter_sentences_in_order(self, task_id: str, audio_file_path: str,
+                                      sentences: List[Sentence], path_manager=None) -> AsyncIterator[Sentence]:
+        """
+        按输入顺序流式产出切片完成的句子：句子i在其之前的句子全部就绪后立即产出，
+        下游（如TTS）无需等待全部切片完成即可开始处理
+        
+        Args:
+            task_id: 任务ID
+            audio_file_path: 音频文件路径
+            sentences: 句子列表
+            path_manager: 共享的路径管理器（可选）
+        """
+        ready: Dict[int, Sentence] = {}
+        next_index = 0
+        async for i, sentence in self.iter_segmented_sentences(
+            task_id, audio_file_path, sentences, path_manager
+        ):
+            ready[i] = sentence
+            while next_index in ready:
+                yield ready.pop(next_index)
+                next_index += 1
     
     async def segment_audio_for_sentences(self, task_id: str, audio_file_path: str, 
                                         sentences: List[Sentence], path_manager=None) -> List[Sentence]:
         """
         为句子列表切分音频，基于说话人分组的智能切片
         
+        下游需要逐句消费时可直接使用 iter_segmented_sentences。
+        
         Args:
             task_id: 任务ID
             audio_file_path: 音频文件路径
@@ -332,49 +473,21 @@ class AudioSegmenter:
             path_manager: 共享的路径管理器（可选）
             
         Returns:
-            List[Sentence]: 更新了音频路径的句子列表
+            List[Sentence]: 更新了音频路径的句子列表（保持输入顺序）
         """
         try:
-            self.logger.info(f"[{task_id}] 开始为 {len(sentences)} 个句子进行智能音频切片")
-            
-            # 转换数据格式
-            transcript_data = self._sentences_to_transcript_data(sentences)
-            self.logger.info(f"[{task_id}] 转换了 {len(transcript_data)} 个转录片段")
-            
-            # 生成切片计划
-            clips_library, sentence_to_clip_id_map = self._create_audio_clips(transcript_data)
-            
-            if not clips_library:
-                self.logger.warning(f"[{task_id}] 未能生成有效的音频切片")
-                return sentences
-            
-            self.logger.info(f"[{task_id}] 生成了 {len(clips_library)} 个音频切片")
-            
-            # 使用传入的path_manager，如果没有则创建新的（向后兼容）
-            if path_manager is None:
-                path_manager = PathManager(task_id)
-                self.logger.warning(f"[{task_id}] AudioSegmenter: 未传入path_manager，创建新的临时目录")
-            
-            audio_clips_dir = path_manager.temp.audio_prompts_dir
-            
-            # 提取并保存音频切片
-            clip_files = await self._extract_and_save_audio_clips(
-                audio_file_path, clips_library, str(audio_clips_dir)
-            )
-            
-            if not clip_files:
-                self.logger.error(f"[{task_id}] 音频切片提取失败")
-                return sentences
-            
-            # 映射切片到句子
-            updated_sentences = self._map_clips_to_sentences(
-                sentences, clips_library, clip_files, sentence_to_clip_id_map
-            )
-        
-            successful_clips = len([s for s in updated_sentences if s.audio])
+            # 按索引回填以保持输入顺序，成功数在循环内累计
+            updated_sentences: List[Optional[Sentence]] = [None] * len(sentences)
+            successful_clips = 0
+            async for i, sentence in self.iter_segmented_sentences(
+                task_id, audio_file_path, sentences, path_manager
+            ):
+                updated_sentences[i] = sentence
+                successful_clips += bool(sentence.audio)
+
             self.logger.info(f"[{task_id}] 智能音频切片完成，成功处理 {successful_clips} 个句子")
             
             return updated_sentences
         except Exception as e:
             self.logger.error(f"[{task_id}] 音频切片处理失败: {e}")
-            return []
\ No newline at end of file
+            return []
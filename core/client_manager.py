@@ -2,7 +2,18 @@
 统一的客户端管理器 - 管理所有 Cloudflare 客户端实例
 """
 import logging
-from typing import Dict, Any
+import threading
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+import httpx
+
+try:
+    import h2  # noqa: F401  httpx 的 HTTP/2 支持依赖 h2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
 from config import get_config
 from core.cloudflare.d1_client import D1Client
 from core.cloudflare.r2_client import R2Client
@@ -11,25 +22,65 @@ logger = logging.getLogger(__name__)
 
 
 class ClientManager:
-    """统一的客户端管理器 - 避免重复初始化客户端"""
+    """统一的客户端管理器 - 进程内单例，避免重复初始化客户端"""
     
-    def __init__(self):
+    _instance: Optional["ClientManager"] = None
+    _instance_lock = threading.Lock()
+    
+    def __new__(cls):
+        # 双重检查锁定：实例已存在时无需加锁
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    instance = super().__new__(cls)
+                    instance._setup()
+                    cls._instance = instance
+        return cls._instance
+    
+    def _setup(self):
+        """初始化单例状态（仅在首次创建实例时执行一次）"""
         self.config = get_config()
         self.logger = logging.getLogger(__name__)
         self._clients: Dict[str, Any] = {}
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._init_lock = threading.Lock()
         self._initialized = False
     
     def initialize_clients(self):
-        """初始化所有客户端"""
+        """初始化所有客户端（首次调用时创建，之后直接返回）"""
         if self._initialized:
             return
         
+        with self._init_lock:
+            if self._initialized:
+                return
+            self._create_clients()
+    
+    def _create_clients(self):
+        """创建共享HTTP连接池与各 Cloudflare 客户端"""
         try:
+            max_connections = getattr(self.config, 'CLOUDFLARE_MAX_CONNECTIONS', 100)
+            
+            # 共享的HTTP连接池，保持长连接避免每次请求重新握手；
+            # 支持HTTP/2时多个D1请求复用同一TLS连接
+            self._http_client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                # 建连单独设短超时：边缘节点不可达时快速失败，而不是占满30秒
+                timeout=httpx.Timeout(30.0, connect=5.0),
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections,
+                    keepalive_expiry=60.0
+                )
+            )
+            
             # 初始化 D1 客户端
             self._clients['d1'] = D1Client(
                 account_id=self.config.CLOUDFLARE_ACCOUNT_ID,
                 api_token=self.config.CLOUDFLARE_API_TOKEN,
-                database_id=self.config.CLOUDFLARE_D1_DATABASE_ID
+                database_id=self.config.CLOUDFLARE_D1_DATABASE_ID,
+                http_client=self._http_client,
+                cache_ttl=getattr(self.config, 'D1_CACHE_TTL', 5.0)
             )
             
             # 初始化 R2 客户端
@@ -37,7 +88,10 @@ class ClientManager:
                 account_id=self.config.CLOUDFLARE_ACCOUNT_ID,
                 access_key_id=self.config.CLOUDFLARE_R2_ACCESS_KEY_ID,
                 secret_access_key=self.config.CLOUDFLARE_R2_SECRET_ACCESS_KEY,
-                bucket_name=self.config.CLOUDFLARE_R2_BUCKET_NAME
+                bucket_name=self.config.CLOUDFLARE_R2_BUCKET_NAME,
+                max_pool_connections=max_connections,
+                media_cache_dir=Path(getattr(self.config, 'BASE_DIR', 'storage')) / "cache" / "r2",
+                media_cache_size=int(getattr(self.config, 'R2_MEDIA_CACHE_MB', 10240)) * 1024 * 1024
             )
             
             self._initialized = True
@@ -74,6 +128,11 @@ class ClientManager:
                     self.logger.info(f"客户端 {client_name} 已关闭")
             
             self._clients.clear()
+            
+            if self._http_client is not None:
+                await self._http_client.aclose()
+                self._http_client = None
+            
             self._initialized = False
             self.logger.info("所有客户端连接已关闭")
             
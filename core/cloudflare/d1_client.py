@@ -1,13 +1,58 @@
 import logging
 import asyncio
+import time
+import json
+from operator import itemgetter
 import httpx
-from typing import List, Dict, Optional, Any
+from collections import OrderedDict
+from typing import List, Dict, NamedTuple, Optional, Any, Tuple, Callable, Awaitable
 from dataclasses import dataclass
 from core.sentence_tools import Sentence
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
-@dataclass
+# 任务状态更新语句（是否同时写入错误信息两种形式）
+_UPDATE_STATUS_SQL = "UPDATE media_tasks SET status = ? WHERE id = ?"
+_UPDATE_STATUS_ERR_SQL = "UPDATE media_tasks SET status = ?, error_message = ? WHERE id = ?"
+
+# 一次取出行中所需的列，按位置解包，避免逐字段字典查找
+_SEGMENT_FIELDS = itemgetter(
+    'sequence', 'start_ms', 'end_ms', 'speaker', 'original_text', 'translated_text', 'is_first', 'is_last'
+)
+_SENTENCE_ROW_FIELDS = itemgetter(
+    'sentence_id', 'raw_text', 'trans_text', 'start_ms', 'end_ms', 'speaker_id',
+    'target_duration_ms', 'is_first', 'is_last', 'ending_silence_ms'
+)
+
+
+def _dumps(payload: Dict) -> bytes:
+    """序列化请求体，优先使用orjson"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def _loads(data: bytes) -> Any:
+    """解析响应体，优先使用orjson"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class MediaPaths(NamedTuple):
+    """任务媒体文件在R2中的路径（缺失时为空字符串）"""
+    audio_path: str
+    video_path: str
+
+
+@dataclass(slots=True)
 class TranscriptionData:
     """转录数据结构"""
     sentence_id: int
@@ -42,34 +87,94 @@ class TranscriptionData:
 class D1Client:
     """Cloudflare D1 数据库客户端"""
     
-    def __init__(self, account_id: str, api_token: str, database_id: str):
+    def __init__(self, account_id: str, api_token: str, database_id: str,
+                 http_client: Optional[httpx.AsyncClient] = None, cache_ttl: float = 5.0):
         self.account_id = account_id
         self.api_token = api_token
         self.database_id = database_id
         self.base_url = f"https://api.cloudflare.com/client/v4/accounts/{account_id}/d1/database/{database_id}"
         self.logger = logging.getLogger(__name__)
         
-        # 创建HTTP客户端
-        self.http_client = None
+        # 认证头随每个请求发送，便于复用共享的连接池
+        self.headers = {
+            "Authorization": f"Bearer {self.api_token}",
+            "Content-Type": "application/json"
+        }
+        
+        # HTTP客户端：传入时复用共享连接池（由调用方负责关闭），否则按需自建
+        self.http_client = http_client
+        self._owns_http_client = http_client is None
+        
+        # 只读查询的短期缓存：key -> (过期时间, 结果)，状态更新时按任务失效
+        self._cache: Dict[str, Tuple[float, Any]] = {}
+        self._cache_ttl = cache_ttl
+        # 写入时条目数超过该值则清理所有过期条目，只读不更新的任务不会让缓存无限增长
+        self._cache_sweep_size = 1024
+        
+        # 进行中的只读查询，同一key的并发调用共享一次网络请求
+        self._inflight: Dict[str, asyncio.Future] = {}
+        
+        # 已定稿任务的句子行LRU缓存：只缓存原始行，每次调用都构造新的 Sentence，
+        # 下游对句子对象的修改不会污染缓存
+        self._sentence_rows_lru: "OrderedDict[str, List[Dict]]" = OrderedDict()
+        self._sentence_rows_lru_size = 256
+        
+        # 任务写入版本号：每次失效时递增，查询期间发生写入则不回填缓存，避免缓存旧状态；
+        # 只在该任务有联表查询进行中时记录（_bundle_readers 为引用计数），查询结束即移除
+        self._task_versions: Dict[str, int] = {}
+        self._bundle_readers: Dict[str, int] = {}
         
     async def _get_client(self) -> httpx.AsyncClient:
         """获取HTTP客户端实例"""
         if self.http_client is None:
-            headers = {
-                "Authorization": f"Bearer {self.api_token}",
-                "Content-Type": "application/json"
-            }
-            self.http_client = httpx.AsyncClient(
-                headers=headers,
-                timeout=30.0
-            )
+            self.http_client = httpx.AsyncClient(timeout=30.0)
+            self._owns_http_client = True
         return self.http_client
     
     async def close(self):
         """关闭HTTP客户端"""
-        if self.http_client:
+        if self.http_client and self._owns_http_client:
             await self.http_client.aclose()
-            self.http_client = None
+        self.http_client = None
+    
+    async def _cached(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """带TTL的只读查询缓存，同一key的并发请求共享一次查询；空结果不缓存"""
+        entry = self._cache.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                return entry[1]
+            del self._cache[key]
+        
+        value = await self._single_flight(f"cache:{key}", factory)
+        if value:
+            self._cache_put(key, value)
+        return value
+    
+    async def _single_flight(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """合并并发的相同查询：已有进行中的请求时直接等待其结果"""
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(factory())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield：单个调用方被取消时不影响其他等待者
+        return await asyncio.shield(future)
+    
+    def _cache_put(self, key: str, value: Any) -> None:
+        """写入缓存，条目过多时顺带清理已过期的条目"""
+        now = time.monotonic()
+        if len(self._cache) >= self._cache_sweep_size:
+            expired = [k for k, (expires_at, _) in self._cache.items() if expires_at <= now]
+            for k in expired:
+                del self._cache[k]
+        self._cache[key] = (now + self._cache_ttl, value)
+    
+    def _invalidate_task(self, task_id: str) -> None:
+        """使某任务的缓存失效"""
+        if task_id in self._task_versions:
+            self._task_versions[task_id] += 1
+        for key in (f"task_info:{task_id}", f"media_paths:{task_id}"):
+            self._cache.pop(key, None)
     
     async def _execute_query(self, sql: str, params: List[Any] = None) -> Dict:
         """执行D1查询"""
@@ -83,14 +188,15 @@ class D1Client:
                 
             response = await client.post(
                 f"{self.base_url}/query",
-                json=payload
+                content=_dumps(payload),
+                headers=self.headers
             )
             
             if response.status_code != 200:
                 self.logger.error(f"D1查询失败: {response.status_code} - {response.text}")
                 return None
                 
-            result = response.json()
+            result = _loads(response.content)
             if not result.get("success"):
                 self.logger.error(f"D1查询错误: {result.get('errors', [])}")
                 return None
@@ -101,8 +207,8 @@ class D1Client:
             self.logger.error(f"D1查询异常: {e}")
             return None
     
-    async def get_transcriptions(self, task_id: str) -> List[TranscriptionData]:
-        """获取任务的转录数据"""
+    async def _query_sentence_rows(self, task_id: str) -> List[Dict]:
+        """查询 sentences 表中任务的句子行"""
         sql = """
         SELECT 
             id as sentence_id,
@@ -122,14 +228,21 @@ class D1Client:
         ORDER BY start_ms ASC
         """
         
-        result = await self._execute_query(sql, [task_id])
+        result = await self._single_flight(
+            f"sentence_rows:{task_id}", lambda: self._execute_query(sql, [task_id])
+        )
         
         if not result or "results" not in result:
             self.logger.warning(f"任务 {task_id} 没有找到转录数据")
             return []
-            
+        return result["results"]
+    
+    async def get_transcriptions(self, task_id: str) -> List[TranscriptionData]:
+        """获取任务的转录数据"""
+        rows = await self._query_sentence_rows(task_id)
+        
         transcriptions = []
-        for row in result["results"]:
+        for row in rows:
             transcription = TranscriptionData(
                 sentence_id=row["sentence_id"],
                 raw_text=row["raw_text"] or "",
@@ -149,8 +262,57 @@ class D1Client:
         self.logger.info(f"获取到任务 {task_id} 的 {len(transcriptions)} 条转录数据")
         return transcriptions
     
+    async def get_sentences(self, task_id: str, cached: bool = False) -> List[Sentence]:
+        """
+        获取任务的句子，查询行直接构造 Sentence，不经过 TranscriptionData 中转
+        
+        Args:
+            task_id: 任务ID
+            cached: 是否使用句子行LRU缓存（仅适用于转录已定稿的任务）
+        """
+        if cached:
+            rows = self._sentence_rows_lru.get(task_id)
+            if rows is not None:
+                self._sentence_rows_lru.move_to_end(task_id)
+            else:
+                rows = await self._query_sentence_rows(task_id)
+                if rows:
+                    self._sentence_rows_lru[task_id] = rows
+                    if len(self._sentence_rows_lru) > self._sentence_rows_lru_size:
+                        self._sentence_rows_lru.popitem(last=False)
+        else:
+            rows = await self._query_sentence_rows(task_id)
+        
+        # 局部绑定，避免循环内反复查找全局名
+        _float, _int, _bool, _str = float, int, bool, str
+        _Sentence = Sentence
+        sentences = []
+        append = sentences.append
+        for (sentence_id, raw_text, trans_text, start_ms, end_ms, speaker_id,
+             target_duration, is_first, is_last, ending_silence) in map(_SENTENCE_ROW_FIELDS, rows):
+            append(_Sentence(
+                original_text=raw_text or "",
+                start_ms=_float(start_ms),
+                end_ms=_float(end_ms),
+                speaker=_str(_int(speaker_id)),
+                translated_text=trans_text or "",
+                sequence=sentence_id,
+                target_duration=_float(target_duration) if target_duration else None,
+                is_first=_bool(is_first),
+                is_last=_bool(is_last),
+                task_id=task_id,
+                ending_silence=_float(ending_silence) if ending_silence else 0.0
+            ))
+        
+        self.logger.info(f"获取到任务 {task_id} 的 {len(sentences)} 个句子")
+        return sentences
+    
     async def get_task_info(self, task_id: str) -> Optional[Dict]:
         """获取任务基本信息"""
+        return await self._cached(f"task_info:{task_id}", lambda: self._query_task_info(task_id))
+    
+    async def _query_task_info(self, task_id: str) -> Optional[Dict]:
+        """查询任务基本信息"""
         sql = """
         SELECT 
             id,
@@ -178,23 +340,14 @@ class D1Client:
     async def update_task_status(self, task_id: str, status: str, error_message: str = None) -> bool:
         """更新任务状态"""
         try:
-            # 构建更新字段
-            fields = ["status = ?"]
-            params = [status]
-            
-            if error_message is not None:
-                fields.append("error_message = ?")
-                params.append(error_message)
-                
-            params.append(task_id)
-            
-            sql = f"""
-            UPDATE media_tasks 
-            SET {', '.join(fields)}
-            WHERE id = ?
-            """
+            if error_message is None:
+                sql, params = _UPDATE_STATUS_SQL, [status, task_id]
+            else:
+                sql, params = _UPDATE_STATUS_ERR_SQL, [status, error_message, task_id]
             
             result = await self._execute_query(sql, params)
+            # 状态已变化，缓存的任务信息失效
+            self._invalidate_task(task_id)
             
             if result and result.get("meta", {}).get("changes", 0) > 0:
                 self.logger.info(f"任务 {task_id} 状态更新为: {status}")
@@ -208,93 +361,140 @@ class D1Client:
             return False
     
     async def to_sentence_objects(self, transcriptions: List[TranscriptionData], task_id: str) -> List[Sentence]:
-        """将转录数据转换为Sentence对象"""
+        """将转录数据转换为Sentence对象（兼容旧调用，新代码请直接使用 get_sentences）"""
         return [trans.to_sentence(task_id) for trans in transcriptions]
     
     async def get_transcription_segments_from_worker(self, task_id: str) -> List[Sentence]:
-        """直接从 Worker 的表获取转录片段"""
-        # 第一步：获取 media_task 信息
-        task_sql = """
+        """直接从 Worker 的表获取转录片段（media_tasks 与 transcription_segments 联表，一次往返）"""
+        segments_sql = """
         SELECT 
-            id, 
-            transcription_id,
-            target_language,
-            translation_style,
-            audio_path,
-            video_path
-        FROM media_tasks 
-        WHERE id = ?
+            s.sequence,
+            s.start_ms,
+            s.end_ms,
+            s.content_type,
+            s.speaker,
+            s.original_text,
+            s.translated_text,
+            s.is_first,
+            s.is_last
+        FROM media_tasks m
+        JOIN transcription_segments s ON s.transcription_id = m.transcription_id
+        WHERE m.id = ? 
+        ORDER BY s.sequence ASC
         """
         
-        task_result = await self._execute_query(task_sql, [task_id])
-        if not task_result or "results" not in task_result or not task_result["results"]:
-            self.logger.warning(f"任务 {task_id} 不存在")
-            return []
-        
-        task_info = task_result["results"][0]
-        transcription_id = task_info.get('transcription_id')
+        segments_result = await self._single_flight(
+            f"segments:{task_id}", lambda: self._execute_query(segments_sql, [task_id])
+        )
         
-        if not transcription_id:
-            self.logger.warning(f"任务 {task_id} 没有转录ID")
+        if not segments_result or not segments_result.get("results"):
+            self.logger.warning(f"任务 {task_id} 不存在、没有转录ID或没有片段数据")
             return []
         
-        # 第二步：获取转录信息（用于判断 is_last）
-        trans_sql = """
-        SELECT total_segments
-        FROM transcriptions 
-        WHERE id = ?
+        sentences = self._segments_to_sentences(segments_result["results"], task_id)
+        self.logger.info(f"获取到任务 {task_id} 的 {len(sentences)} 个句子")
+        return sentences
+    
+    async def get_task_bundle(self, task_id: str) -> Optional[Dict[str, Any]]:
         """
+        一次查询同时获取任务信息、媒体路径和句子列表
         
-        trans_result = await self._execute_query(trans_sql, [transcription_id])
-        total_segments = 0
-        if trans_result and "results" in trans_result and trans_result["results"]:
-            total_segments = trans_result["results"][0].get('total_segments', 0)
+        media_tasks 左联 transcription_segments，任务字段在每行重复，避免多次REST往返。
         
-        # 第三步：获取所有片段
-        segments_sql = """
+        Returns:
+            Dict: {'task_info': Dict, 'media_paths': MediaPaths, 'sentences': List[Sentence]}，任务不存在时返回None
+        """
+        sql = """
         SELECT 
-            sequence,
-            start_ms,
-            end_ms,
-            content_type,
-            speaker,
-            original_text,
-            translated_text,
-            is_first,
-            is_last
-        FROM transcription_segments 
-        WHERE transcription_id = ? 
-        ORDER BY sequence ASC
+            m.id,
+            m.status,
+            m.target_language,
+            m.translation_style,
+            m.audio_path,
+            m.video_path,
+            m.error_message,
+            m.created_at,
+            m.transcription_id,
+            s.sequence,
+            s.start_ms,
+            s.end_ms,
+            s.content_type,
+            s.speaker,
+            s.original_text,
+            s.translated_text,
+            s.is_first,
+            s.is_last
+        FROM media_tasks m
+        LEFT JOIN transcription_segments s ON s.transcription_id = m.transcription_id
+        WHERE m.id = ? 
+        ORDER BY s.sequence ASC
         """
         
-        segments_result = await self._execute_query(segments_sql, [transcription_id])
+        self._bundle_readers[task_id] = self._bundle_readers.get(task_id, 0) + 1
+        version = self._task_versions.setdefault(task_id, 0)
+        try:
+            result = await self._single_flight(
+                f"bundle:{task_id}", lambda: self._execute_query(sql, [task_id])
+            )
+            written_during_query = self._task_versions[task_id] != version
+        finally:
+            self._bundle_readers[task_id] -= 1
+            if not self._bundle_readers[task_id]:
+                del self._bundle_readers[task_id]
+                del self._task_versions[task_id]
         
-        if not segments_result or "results" not in segments_result:
-            self.logger.warning(f"转录 {transcription_id} 没有片段数据")
-            return []
+        if not result or not result.get("results"):
+            self.logger.warning(f"任务 {task_id} 不存在")
+            return None
         
+        rows = result["results"]
+        first_row = rows[0]
+        task_info = {key: first_row.get(key) for key in (
+            'id', 'status', 'target_language', 'translation_style', 'audio_path',
+            'video_path', 'error_message', 'created_at', 'transcription_id'
+        )}
+        media_paths = MediaPaths(
+            audio_path=first_row.get('audio_path') or '',
+            video_path=first_row.get('video_path') or ''
+        )
+        if not written_during_query:
+            self._cache_put(f"task_info:{task_id}", task_info)
+            self._cache_put(f"media_paths:{task_id}", media_paths)
+        
+        # 没有片段时左联结果的片段列为NULL
+        segments = [row for row in rows if row.get('sequence') is not None]
+        if not segments:
+            self.logger.warning(f"任务 {task_id} 没有转录ID或没有片段数据")
+        sentences = self._segments_to_sentences(segments, task_id)
+        
+        self.logger.info(f"获取到任务 {task_id} 的信息、媒体路径和 {len(sentences)} 个句子")
+        return {
+            'task_info': task_info,
+            'media_paths': media_paths,
+            'sentences': sentences
+        }
+    
+    def _segments_to_sentences(self, segments: List[Dict], task_id: str) -> List[Sentence]:
+        """将 Worker 片段行转换为 Sentence 对象并计算目标时长"""
         # 直接创建 Sentence 对象，使用 Worker 字段名
         sentences = []
-        segments = segments_result["results"]
-        
-        for idx, segment in enumerate(segments):
+        for (sequence, start_ms, end_ms, speaker, original_text,
+             translated_text, is_first, is_last) in map(_SEGMENT_FIELDS, segments):
             sentence = Sentence(
-                sequence=segment['sequence'],
-                start_ms=float(segment['start_ms']),
-                end_ms=float(segment['end_ms']),
-                speaker=segment['speaker'] or 'unknown',
-                original_text=segment['original_text'] or '',
-                translated_text=segment['translated_text'] or '',
+                sequence=sequence,
+                start_ms=float(start_ms),
+                end_ms=float(end_ms),
+                speaker=speaker or 'unknown',
+                original_text=original_text or '',
+                translated_text=translated_text or '',
                 task_id=task_id,
-                is_first=bool(segment['is_first']),
-                is_last=bool(segment['is_last'])
+                is_first=bool(is_first),
+                is_last=bool(is_last)
             )
             sentences.append(sentence)
         
         # 计算target_duration - 使用下一句start减去当前句start
         self._calculate_target_durations(sentences)
-        
-        self.logger.info(f"获取到任务 {task_id} 的 {len(sentences)} 个句子")
         return sentences
     
     def _calculate_target_durations(self, sentences: List) -> None:
@@ -322,8 +522,12 @@ class D1Client:
                     f"(end: {sentence.end_ms} - start: {sentence.start_ms})"
                 )
     
-    async def get_worker_media_paths(self, task_id: str) -> Dict[str, str]:
+    async def get_worker_media_paths(self, task_id: str) -> Optional[MediaPaths]:
         """获取 Worker 的媒体文件路径"""
+        return await self._cached(f"media_paths:{task_id}", lambda: self._query_worker_media_paths(task_id))
+    
+    async def _query_worker_media_paths(self, task_id: str) -> Optional[MediaPaths]:
+        """查询 Worker 的媒体文件路径"""
         sql = """
         SELECT audio_path, video_path
         FROM media_tasks 
@@ -333,10 +537,10 @@ class D1Client:
         result = await self._execute_query(sql, [task_id])
         
         if not result or "results" not in result or not result["results"]:
-            return {}
+            return None
         
         task_info = result["results"][0]
-        return {
-            'audio_path': task_info.get('audio_path', ''),
-            'video_path': task_info.get('video_path', '')
-        }
\ No newline at end of file
+        return MediaPaths(
+            audio_path=task_info.get('audio_path') or '',
+            video_path=task_info.get('video_path') or ''
+        )
\ No newline at end of file
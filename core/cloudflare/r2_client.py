@@ -1,19 +1,46 @@
 import logging
 import asyncio
-import aiofiles
+import random
 import boto3
+from boto3.exceptions import S3UploadFailedError
+from boto3.s3.transfer import TransferConfig
 from botocore.config import Config
 from botocore.exceptions import ClientError
-from typing import Dict, List, Optional, Union
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, Union
 from pathlib import Path
 import io
+import os
+import re
+import gzip
+import shutil
 
 logger = logging.getLogger(__name__)
 
+# 按文件扩展名推断的MIME类型
+_CONTENT_TYPE_MAP = {
+    '.mp4': 'video/mp4',
+    '.ts': 'video/mp2t',
+    '.m3u8': 'application/vnd.apple.mpegurl',
+    '.wav': 'audio/wav',
+    '.mp3': 'audio/mpeg'
+}
+
+# 可重试的R2瞬时错误码，其余错误（权限、参数等）直接失败
+_RETRIABLE_ERROR_CODES = frozenset({
+    'SlowDown', 'ServiceUnavailable', '503', 'InternalError', 'RequestTimeout', 'TooManyRequests', '429'
+})
+# 表示服务端限流的HTTP状态码，需要整体降速而不仅是当前请求退避
+_THROTTLE_STATUS_CODES = frozenset({429, 503})
+
+# 服务端 Retry-After 的采纳上限（秒）：退避在上传并发槽位内等待，过长会拖住整条流水线
+_MAX_RETRY_AFTER = 5.0
+
 class R2Client:
     """Cloudflare R2 对象存储客户端"""
     
-    def __init__(self, account_id: str, access_key_id: str, secret_access_key: str, bucket_name: str):
+    def __init__(self, account_id: str, access_key_id: str, secret_access_key: str, bucket_name: str,
+                 max_pool_connections: int = 10, media_cache_dir: Optional[Union[str, Path]] = None,
+                 media_cache_size: int = 0):
         self.account_id = account_id
         self.access_key_id = access_key_id
         self.secret_access_key = secret_access_key
@@ -22,14 +49,39 @@ class R2Client:
         
         # R2的S3兼容端点
         self.endpoint_url = f"https://{account_id}.r2.cloudflarestorage.com"
+        # 公共访问URL前缀（假设存储桶配置了公共访问）
+        self._public_url_prefix = f"https://pub-{account_id}.r2.dev/"
         
         # 创建S3客户端配置
         self.s3_config = Config(
             region_name='auto',
             retries={'max_attempts': 3},
-            s3={'addressing_style': 'path'}
+            s3={'addressing_style': 'path'},
+            max_pool_connections=max_pool_connections,
+            tcp_keepalive=True
+        )
+        
+        # 大文件分块并发传输配置（超过8MB按范围请求并行传输）；
+        # 网络读取与磁盘写入由独立线程经有界IO队列衔接，两者重叠进行且内存占用有上限
+        self.transfer_config = TransferConfig(
+            multipart_threshold=8 * 1024 * 1024,
+            multipart_chunksize=8 * 1024 * 1024,
+            max_concurrency=8,
+            max_io_queue=16,
+            io_chunksize=1024 * 1024,
+            use_threads=True
         )
         
+        # 写请求限速器（由上层存储管理器设置），收到限流响应时清空令牌让所有任务一起降速
+        self.write_limiter = None
+        
+        # 按ETag寻址的本地下载缓存（重跑任务时复用已下载的媒体文件），按最近使用淘汰
+        self.media_cache_dir: Optional[Path] = None
+        self.media_cache_size = media_cache_size
+        if media_cache_dir and media_cache_size > 0:
+            self.media_cache_dir = Path(media_cache_dir)
+            self.media_cache_dir.mkdir(parents=True, exist_ok=True)
+        
         # 初始化S3客户端
         self.s3_client = None
         
@@ -45,6 +97,62 @@ class R2Client:
             )
         return self.s3_client
     
+    @staticmethod
+    def _underlying_client_error(error: BaseException) -> Optional[ClientError]:
+        """取出真实的 ClientError：upload_file/upload_fileobj 会将其包装为 S3UploadFailedError"""
+        if isinstance(error, ClientError):
+            return error
+        cause = error.__cause__ or error.__context__
+        return cause if isinstance(cause, ClientError) else None
+    
+    async def _with_retry(self, fn: Callable[[], Any], *, retriable: tuple = (ClientError, S3UploadFailedError),
+                          max_attempts: int = 2, base_delay: float = 0.1, max_delay: float = 0.8) -> Any:
+        """
+        在线程中执行同步R2调用，仅对瞬时错误按指数退避加随机抖动重试
+        
+        botocore 已在单次调用内重试（见 s3_config），但各调用独立退避、互不感知；
+        这一层只在 botocore 重试耗尽后再补一轮，并在限流时清空共享令牌桶，
+        让所有并发写请求一起降速。默认2次尝试，单次调用最多 2×3 次请求。
+        
+        Args:
+            fn: 无参同步调用（每次重试都会重新执行）
+            retriable: 参与判断的异常类型
+            max_attempts: 最大尝试次数
+            base_delay: 初始退避基数（秒）
+            max_delay: 单次退避上限（秒）
+        """
+        for attempt in range(max_attempts):
+            try:
+                return await asyncio.to_thread(fn)
+            except retriable as e:
+                client_error = self._underlying_client_error(e)
+                response = getattr(client_error, 'response', None) or {}
+                code = str(response.get('Error', {}).get('Code', ''))
+                if code not in _RETRIABLE_ERROR_CODES or attempt == max_attempts - 1:
+                    raise
+                
+                delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+                metadata = response.get('ResponseMetadata', {})
+                if self.write_limiter is not None and (
+                    code == 'SlowDown' or metadata.get('HTTPStatusCode') in _THROTTLE_STATUS_CODES
+                ):
+                    # 服务端要求降速：按 Retry-After 清空令牌，所有并发任务一起暂停
+                    try:
+                        retry_after = float(metadata.get('HTTPHeaders', {}).get('retry-after', delay))
+                    except (TypeError, ValueError):
+                        retry_after = delay
+                    retry_after = min(max(retry_after, 0.0), _MAX_RETRY_AFTER)
+                    self.write_limiter.drain(retry_after)
+                    delay = max(delay, retry_after)
+                
+                self.logger.warning(f"R2请求瞬时失败 ({code})，{delay:.2f}秒后重试 ({attempt + 1}/{max_attempts})")
+                await asyncio.sleep(delay)
+    
+    def _get_object_bytes(self, client, r2_path: str) -> bytes:
+        """获取对象并读取全部内容（同步，需在线程中调用）"""
+        response = client.get_object(Bucket=self.bucket_name, Key=r2_path)
+        return response['Body'].read()
+    
     async def download_audio(self, audio_path: str) -> Optional[bytes]:
         """
         从R2下载音频文件
@@ -58,15 +166,8 @@ class R2Client:
         try:
             client = self._get_client()
             
-            # 使用asyncio.to_thread异步执行S3下载
-            response = await asyncio.to_thread(
-                client.get_object,
-                Bucket=self.bucket_name,
-                Key=audio_path
-            )
-            
-            # 读取文件内容
-            audio_data = await asyncio.to_thread(response['Body'].read)
+            # 请求与读取在同一次线程切换中完成
+            audio_data = await asyncio.to_thread(self._get_object_bytes, client, audio_path)
             
             self.logger.info(f"成功从R2下载音频文件: {audio_path} ({len(audio_data)} bytes)")
             return audio_data
@@ -95,15 +196,8 @@ class R2Client:
         try:
             client = self._get_client()
             
-            # 使用asyncio.to_thread异步执行S3下载
-            response = await asyncio.to_thread(
-                client.get_object,
-                Bucket=self.bucket_name,
-                Key=video_path
-            )
-            
-            # 读取文件内容
-            video_data = await asyncio.to_thread(response['Body'].read)
+            # 请求与读取在同一次线程切换中完成
+            video_data = await asyncio.to_thread(self._get_object_bytes, client, video_path)
             
             self.logger.info(f"成功从R2下载视频文件: {video_path} ({len(video_data)} bytes)")
             return video_data
@@ -119,8 +213,163 @@ class R2Client:
             self.logger.error(f"下载视频文件异常 {video_path}: {e}")
             return None
     
+    async def get_object_bytes_or_none(self, r2_path: str,
+                                       etag: Optional[str] = None) -> Tuple[Optional[bytes], Optional[str]]:
+        """
+        单次GET获取对象内容，不存在时不报错；传入ETag时内容未变化则不传输数据
+        
+        Args:
+            r2_path: R2中的文件路径
+            etag: 已缓存内容的ETag
+            
+        Returns:
+            Tuple[data, etag]: 对象不存在时为 (None, None)；内容未变化时为 (None, etag)
+        """
+        def fetch() -> Tuple[bytes, str]:
+            params = {'Bucket': self.bucket_name, 'Key': r2_path}
+            if etag:
+                params['IfNoneMatch'] = etag
+            response = self._get_client().get_object(**params)
+            data = response['Body'].read()
+            # 以gzip编码存储的对象在此解压，调用方拿到原始内容
+            if response.get('ContentEncoding') == 'gzip':
+                data = gzip.decompress(data)
+            return data, response.get('ETag')
+        
+        try:
+            return await asyncio.to_thread(fetch)
+        except ClientError as e:
+            error_code = e.response['Error']['Code']
+            if error_code in ('NoSuchKey', '404'):
+                return None, None
+            if error_code in ('304', 'NotModified'):
+                return None, etag
+            self.logger.error(f"获取R2文件失败 {r2_path}: {e}")
+            return None, None
+    
+    async def _head_object(self, r2_path: str) -> Optional[Dict[str, Any]]:
+        """HEAD请求获取对象元数据，失败时返回None"""
+        try:
+            return await asyncio.to_thread(
+                self._get_client().head_object, Bucket=self.bucket_name, Key=r2_path
+            )
+        except Exception as e:
+            self.logger.warning(f"获取R2文件元数据失败 {r2_path}: {e}")
+            return None
+    
+    def _download_preallocated(self, client, r2_path: str, dest_path: Path, size: Optional[int]) -> None:
+        """按对象大小预分配临时文件后分块并发下载，完成后原子替换到目标路径，失败时删除临时文件"""
+        # 先写入 .part 文件：中途崩溃不会在目标路径留下看似完整（已预分配）的文件
+        part_path = dest_path.with_name(dest_path.name + '.part')
+        try:
+            with open(part_path, 'wb') as f:
+                if size and hasattr(os, 'posix_fallocate'):
+                    try:
+                        os.posix_fallocate(f.fileno(), 0, size)
+                    except OSError:
+                        pass  # 文件系统不支持时按普通写入处理
+                # s3transfer 的各范围请求自行固定同一ETag，对象中途被替换时下载失败而非拼接
+                client.download_fileobj(self.bucket_name, r2_path, f, Config=self.transfer_config)
+            os.replace(part_path, dest_path)
+        except BaseException:
+            part_path.unlink(missing_ok=True)
+            raise
+    
+    @staticmethod
+    def _link_or_copy(src: Path, dest: Path) -> None:
+        """优先硬链接（不复制数据），跨文件系统时退化为复制"""
+        try:
+            if dest.exists():
+                dest.unlink()
+            os.link(src, dest)
+        except OSError:
+            shutil.copyfile(src, dest)
+    
+    def _restore_from_media_cache(self, cache_path: Path, dest_path: Path) -> bool:
+        """缓存命中时将文件链接到目标路径并刷新其使用时间"""
+        if not cache_path.exists():
+            return False
+        self._link_or_copy(cache_path, dest_path)
+        os.utime(cache_path)
+        return True
+    
+    def _store_in_media_cache(self, src_path: Path, cache_path: Path) -> None:
+        """将下载结果放入缓存，超出容量时按最近使用时间淘汰最旧的文件"""
+        self._link_or_copy(src_path, cache_path)
+        
+        entries = []
+        total = 0
+        for entry in os.scandir(self.media_cache_dir):
+            if entry.is_file():
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.media_cache_size:
+                break
+            os.remove(path)
+            total -= size
+    
+    async def download_to_file(self, r2_path: str, dest_path: Union[str, Path]) -> bool:
+        """
+        从R2直接流式下载文件到本地磁盘，不在内存中缓存完整内容
+        
+        启用媒体缓存时先按ETag查找本地缓存，命中则直接链接，无需重新下载。
+        
+        Args:
+            r2_path: R2中的文件路径
+            dest_path: 本地目标路径
+            
+        Returns:
+            bool: 下载是否成功
+        """
+        try:
+            client = self._get_client()
+            dest_path = Path(dest_path)
+            
+            head = await self._head_object(r2_path)
+            etag = head.get('ETag') if head else None
+            size = head.get('ContentLength') if head else None
+            
+            cache_path = None
+            if self.media_cache_dir is not None:
+                if etag:
+                    # ETag带引号，分块上传的ETag含"-N"，只保留文件名安全的字符
+                    cache_name = re.sub(r'[^0-9A-Za-z-]', '', etag) + Path(r2_path).suffix
+                    cache_path = self.media_cache_dir / cache_name
+                    if await asyncio.to_thread(self._restore_from_media_cache, cache_path, dest_path):
+                        self.logger.info(f"命中本地媒体缓存: {r2_path} -> {dest_path}")
+                        return True
+            
+            # 预分配整个文件后由传输线程并发按范围写入，避免逐块扩展文件的元数据开销
+            await asyncio.to_thread(
+                self._download_preallocated, client, r2_path, dest_path, size
+            )
+            
+            if cache_path is not None:
+                try:
+                    await asyncio.to_thread(self._store_in_media_cache, dest_path, cache_path)
+                except OSError as e:
+                    self.logger.warning(f"写入本地媒体缓存失败 {r2_path}: {e}")
+            
+            self.logger.info(f"成功从R2下载文件: {r2_path} -> {dest_path}")
+            return True
+            
+        except ClientError as e:
+            error_code = e.response['Error']['Code']
+            if error_code in ('NoSuchKey', '404'):
+                self.logger.error(f"R2中未找到文件: {r2_path}")
+            else:
+                self.logger.error(f"下载文件失败 {r2_path}: {e}")
+            return False
+        except Exception as e:
+            self.logger.error(f"下载文件异常 {r2_path}: {e}")
+            return False
+    
     async def upload_file(self, file_data: Union[bytes, str], r2_path: str, 
-                         content_type: str = None) -> Optional[str]:
+                         content_type: str = None, content_encoding: str = None) -> Optional[str]:
         """
         上传文件到R2
         
@@ -128,6 +377,7 @@ class R2Client:
             file_data: 文件数据（bytes）或本地文件路径（str）
             r2_path: R2中的存储路径
             content_type: 文件MIME类型
+            content_encoding: 内容编码（如数据已gzip压缩时为'gzip'）
             
         Returns:
             str: 文件的公共URL，失败时返回None
@@ -135,43 +385,58 @@ class R2Client:
         try:
             client = self._get_client()
             
-            # 准备上传数据
-            if isinstance(file_data, str):
-                # 如果是文件路径，读取文件
-                async with aiofiles.open(file_data, 'rb') as f:
-                    upload_data = await f.read()
-                    
+            multipart_threshold = self.transfer_config.multipart_threshold
+            is_path = isinstance(file_data, str)
+            
+            if is_path:
                 # 自动检测content_type
                 if not content_type:
-                    file_ext = Path(file_data).suffix.lower()
-                    content_type_map = {
-                        '.mp4': 'video/mp4',
-                        '.ts': 'video/mp2t',
-                        '.m3u8': 'application/vnd.apple.mpegurl',
-                        '.wav': 'audio/wav',
-                        '.mp3': 'audio/mpeg'
-                    }
-                    content_type = content_type_map.get(file_ext, 'application/octet-stream')
+                    content_type = _CONTENT_TYPE_MAP.get(Path(file_data).suffix.lower(), 'application/octet-stream')
+                data_size = Path(file_data).stat().st_size
             else:
-                upload_data = file_data
-                
-            # 准备上传参数
-            upload_args = {
-                'Bucket': self.bucket_name,
-                'Key': r2_path,
-                'Body': upload_data
-            }
+                data_size = len(file_data)
             
+            extra_args = {}
             if content_type:
-                upload_args['ContentType'] = content_type
-                
-            # 执行上传
-            await asyncio.to_thread(client.put_object, **upload_args)
+                extra_args['ContentType'] = content_type
+            if content_encoding:
+                extra_args['ContentEncoding'] = content_encoding
+            extra_args = extra_args or None
+            
+            if is_path:
+                # 从磁盘流式上传，超过阈值时自动分块并发上传
+                await self._with_retry(lambda: client.upload_file(
+                    file_data,
+                    self.bucket_name,
+                    r2_path,
+                    ExtraArgs=extra_args,
+                    Config=self.transfer_config
+                ))
+            elif data_size > multipart_threshold:
+                # 大数据分块并发上传（每次尝试使用新的文件对象）
+                await self._with_retry(lambda: client.upload_fileobj(
+                    io.BytesIO(file_data),
+                    self.bucket_name,
+                    r2_path,
+                    ExtraArgs=extra_args,
+                    Config=self.transfer_config
+                ))
+            else:
+                # 准备上传参数
+                upload_args = {
+                    'Bucket': self.bucket_name,
+                    'Key': r2_path,
+                    'Body': file_data,
+                    **(extra_args or {})
+                }
+                    
+                # 执行上传
+                await self._with_retry(lambda: client.put_object(**upload_args))
             
             # 生成公共URL（假设存储桶配置了公共访问）
-            public_url = f"https://pub-{self.account_id}.r2.dev/{r2_path}"
+            public_url = self._public_url_prefix + r2_path
             
-            self.logger.info(f"成功上传文件到R2: {r2_path} ({len(upload_data)} bytes)")
+            self.logger.info(f"成功上传文件到R2: {r2_path} ({data_size} bytes)")
             return public_url
             
         except Exception as e:
@@ -206,8 +471,36 @@ class R2Client:
             str: 播放列表的公共URL
         """
         r2_path = f"hls/{task_id}/playlist.m3u8"
-        playlist_bytes = playlist_content.encode('utf-8')
-        return await self.upload_file(playlist_bytes, r2_path, 'application/vnd.apple.mpegurl')
+        playlist_bytes = gzip.compress(playlist_content.encode('utf-8'), compresslevel=6)
+        return await self.upload_file(playlist_bytes, r2_path, 'application/vnd.apple.mpegurl', 'gzip')
+    
+    async def iter_file_pages(self, prefix: str = "") -> AsyncIterator[List[Dict]]:
+        """
+        逐页列出R2中的文件（每页最多1000个），调用方可边取边处理，无需一次性载入全部列表
+        
+        Args:
+            prefix: 文件路径前缀
+            
+        Yields:
+            List[Dict]: 一页文件信息
+        """
+        client = self._get_client()
+        pages = iter(client.get_paginator('list_objects_v2').paginate(Bucket=self.bucket_name, Prefix=prefix))
+        
+        while True:
+            # 分页器在取下一页时才发起请求
+            page = await asyncio.to_thread(next, pages, None)
+            if page is None:
+                break
+            yield [
+                {
+                    'key': obj['Key'],
+                    'size': obj['Size'],
+                    'last_modified': obj['LastModified'],
+                    'etag': obj['ETag']
+                }
+                for obj in page.get('Contents', [])
+            ]
     
     async def list_files(self, prefix: str = "") -> List[Dict]:
         """
@@ -220,22 +513,9 @@ class R2Client:
             List[Dict]: 文件信息列表
         """
         try:
-            client = self._get_client()
-            
-            response = await asyncio.to_thread(
-                client.list_objects_v2,
-                Bucket=self.bucket_name,
-                Prefix=prefix
-            )
-            
             files = []
-            for obj in response.get('Contents', []):
-                files.append({
-                    'key': obj['Key'],
-                    'size': obj['Size'],
-                    'last_modified': obj['LastModified'],
-                    'etag': obj['ETag']
-                })
+            async for page in self.iter_file_pages(prefix):
+                files.extend(page)
                 
             self.logger.info(f"列出R2文件: {len(files)} 个文件 (前缀: {prefix})")
             return files
@@ -254,21 +534,50 @@ class R2Client:
         Returns:
             bool: 删除是否成功
         """
-        try:
-            client = self._get_client()
-            
-            await asyncio.to_thread(
-                client.delete_object,
-                Bucket=self.bucket_name,
-                Key=r2_path
-            )
-            
-            self.logger.info(f"成功删除R2文件: {r2_path}")
-            return True
+        failed = await self.delete_files([r2_path])
+        return not failed
+    
+    async def delete_files(self, r2_paths: List[str]) -> Dict[str, str]:
+        """
+        批量删除R2中的文件，每次请求最多删除1000个
+        
+        Args:
+            r2_paths: R2中的文件路径列表
             
-        except Exception as e:
-            self.logger.error(f"删除R2文件失败 {r2_path}: {e}")
-            return False
+        Returns:
+            Dict[str, str]: 删除失败的文件路径及错误信息，全部成功时为空
+        """
+        failed: Dict[str, str] = {}
+        if not r2_paths:
+            return failed
+        
+        client = self._get_client()
+        
+        async def delete_chunk(chunk: List[str]) -> None:
+            try:
+                response = await self._with_retry(lambda: client.delete_objects(
+                    Bucket=self.bucket_name,
+                    Delete={'Objects': [{'Key': key} for key in chunk], 'Quiet': True}
+                ))
+                # Quiet模式下只返回删除失败的对象
+                for error in response.get('Errors', []):
+                    failed[error['Key']] = error.get('Message', error.get('Code', ''))
+            except Exception as e:
+                for key in chunk:
+                    failed[key] = str(e)
+        
+        # 各批次并发删除
+        await asyncio.gather(*[
+            delete_chunk(r2_paths[start:start + 1000])
+            for start in range(0, len(r2_paths), 1000)
+        ])
+        
+        deleted_count = len(r2_paths) - len(failed)
+        if failed:
+            self.logger.error(f"删除R2文件部分失败: 成功 {deleted_count} 个, 失败 {len(failed)} 个")
+        else:
+            self.logger.info(f"成功删除R2文件: {deleted_count} 个")
+        return failed
     
     async def file_exists(self, r2_path: str) -> bool:
         """
@@ -1,10 +1,13 @@
 import logging
 import asyncio
-import aiofiles
+import gzip
+import os
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple, Union
 from core.cloudflare.r2_client import R2Client
+from core.client_manager import ClientManager
 from config import Config
+from utils.async_utils import AsyncTokenBucket
 
 logger = logging.getLogger(__name__)
 
@@ -15,16 +18,29 @@ class R2HLSStorageManager:
         self.config = config or Config()
         self.logger = logging.getLogger(__name__)
         
-        # 初始化R2客户端
-        self.r2_client = R2Client(
-            account_id=self.config.CLOUDFLARE_ACCOUNT_ID,
-            access_key_id=self.config.CLOUDFLARE_R2_ACCESS_KEY_ID,
-            secret_access_key=self.config.CLOUDFLARE_R2_SECRET_ACCESS_KEY,
-            bucket_name=self.config.CLOUDFLARE_R2_BUCKET_NAME
+        # 复用全局客户端管理器中的R2客户端，共享连接池
+        self.r2_client: R2Client = ClientManager().get_r2_client()
+        
+        # 限制并发上传数，避免大批分段同时占满连接池
+        self._upload_sem = asyncio.Semaphore(getattr(self.config, 'R2_UPLOAD_CONCURRENCY', 16) or 16)
+        
+        # 写请求限速，保持在R2单存储桶写入速率上限以下，避免429重试
+        self._write_bucket = AsyncTokenBucket(
+            rate=getattr(self.config, 'R2_WRITE_RATE', 800),
+            burst=getattr(self.config, 'R2_WRITE_BURST', 200)
         )
+        # R2客户端收到限流响应（429/503、Retry-After）时据此清空令牌，整条流水线一起降速
+        self.r2_client.write_limiter = self._write_bucket
+        
+        # 播放列表缓存：task_id -> (ETag, 内容)，内容未变化时无需重新下载
+        self._playlist_etag_cache: Dict[str, Tuple[str, str]] = {}
         
         self.logger.info("R2 HLS存储管理器已初始化")
     
+    def release_task(self, task_id: str) -> None:
+        """释放任务的播放列表缓存（任务最终化或清理后不再需要增量恢复播放列表）"""
+        self._playlist_etag_cache.pop(task_id, None)
+    
     async def upload_segment(self, task_id: str, segment_file_path: str, segment_name: str) -> Dict:
         """
         上传单个TS分段文件到R2
@@ -41,16 +57,14 @@ class R2HLSStorageManager:
             # R2存储路径：hls/{task_id}/{segment_name}
             r2_path = f"hls/{task_id}/{segment_name}"
             
-            # 读取文件内容
-            async with aiofiles.open(segment_file_path, 'rb') as f:
-                file_bytes = await f.read()
-            
-            # 上传到R2
-            public_url = await self.r2_client.upload_file(
-                file_data=file_bytes,
-                r2_path=r2_path,
-                content_type='video/mp2t'
-            )
+            async with self._upload_sem:
+                # 传入文件路径，由R2客户端从磁盘流式上传，不整体读入内存
+                await self._write_bucket.acquire()
+                public_url = await self.r2_client.upload_file(
+                    file_data=str(segment_file_path),
+                    r2_path=r2_path,
+                    content_type='video/mp2t'
+                )
             
             if public_url:
                 self.logger.info(f"[{task_id}] 成功上传分段文件: {segment_name}")
@@ -58,7 +72,7 @@ class R2HLSStorageManager:
                     "status": "success",
                     "storage_path": r2_path,
                     "segment_name": segment_name,
-                    "file_size": len(file_bytes),
+                    "file_size": os.path.getsize(segment_file_path),
                     "public_url": public_url
                 }
             else:
@@ -76,13 +90,13 @@ class R2HLSStorageManager:
                 "segment_name": segment_name
             }
     
-    async def upload_playlist(self, task_id: str, playlist_content: str) -> Dict:
+    async def upload_playlist(self, task_id: str, playlist_content: Union[str, bytes]) -> Dict:
         """
         上传M3U8播放列表到R2
         
         Args:
             task_id: 任务ID
-            playlist_content: M3U8播放列表内容
+            playlist_content: M3U8播放列表内容（字符串或已编码的UTF-8字节）
             
         Returns:
             Dict: 包含上传结果的字典
@@ -91,14 +105,19 @@ class R2HLSStorageManager:
             # R2存储路径：hls/{task_id}/playlist.m3u8
             r2_path = f"hls/{task_id}/playlist.m3u8"
             
-            # 将字符串转换为字节
-            file_bytes = playlist_content.encode('utf-8')
+            # 将字符串转换为字节并gzip压缩（重复度高的文本，压缩率高），
+            # 以 Content-Encoding: gzip 存储，播放器的HTTP层会自动解压
+            if isinstance(playlist_content, str):
+                playlist_content = playlist_content.encode('utf-8')
+            file_bytes = gzip.compress(playlist_content, compresslevel=6)
             
             # 上传到R2
+            await self._write_bucket.acquire()
             public_url = await self.r2_client.upload_file(
                 file_data=file_bytes,
                 r2_path=r2_path,
-                content_type='application/vnd.apple.mpegurl'
+                content_type='application/vnd.apple.mpegurl',
+                content_encoding='gzip'
             )
             
             if public_url:
@@ -134,19 +153,24 @@ class R2HLSStorageManager:
         """
         try:
             r2_path = f"hls/{task_id}/playlist.m3u8"
+            cached = self._playlist_etag_cache.get(task_id)
             
-            # 检查文件是否存在
-            if not await self.r2_client.file_exists(r2_path):
+            # 单次条件GET：不存在返回空，未变化时不传输内容
+            playlist_bytes, etag = await self.r2_client.get_object_bytes_or_none(
+                r2_path, cached[0] if cached else None
+            )
+            
+            if playlist_bytes is None:
+                if etag and cached:
+                    return cached[1]
+                self._playlist_etag_cache.pop(task_id, None)
                 return None
             
-            # 下载播放列表文件
-            playlist_bytes = await self.r2_client.download_audio(r2_path)  # 复用下载方法
-            if playlist_bytes:
-                playlist_content = playlist_bytes.decode('utf-8')
-                self.logger.info(f"[{task_id}] 从R2恢复播放列表，长度: {len(playlist_content)}")
-                return playlist_content
-            
-            return None
+            playlist_content = playlist_bytes.decode('utf-8')
+            if etag:
+                self._playlist_etag_cache[task_id] = (etag, playlist_content)
+            self.logger.info(f"[{task_id}] 从R2恢复播放列表，长度: {len(playlist_content)}")
+            return playlist_content
             
         except Exception as e:
             self.logger.debug(f"[{task_id}] 无法从R2获取现有播放列表: {e}")
@@ -166,7 +190,11 @@ class R2HLSStorageManager:
         try:
             r2_path = f"videos/{task_id}/final_video.mp4"
             
-            # 上传视频文件
+            # 上传视频文件：大文件由R2客户端按8MB分块并发上传（失败时自动中止分块上传），
+            # 每个分块都是一次写请求，按分块数获取令牌
+            chunk_size = self.r2_client.transfer_config.multipart_chunksize
+            part_count = -(-Path(video_file_path).stat().st_size // chunk_size)
+            await self._write_bucket.acquire(part_count + 2 if part_count > 1 else 1)
             public_url = await self.r2_client.upload_file(
                 file_data=video_file_path,
                 r2_path=r2_path,
@@ -196,18 +224,18 @@ class R2HLSStorageManager:
         """
         try:
             prefix = f"hls/{task_id}/"
-            files = await self.r2_client.list_files(prefix)
             
-            # 过滤出TS分段文件
+            # 逐页过滤出TS分段文件
             segments = []
-            for file_info in files:
-                if file_info['key'].endswith('.ts'):
-                    segments.append({
-                        'segment_name': Path(file_info['key']).name,
-                        'size': file_info['size'],
-                        'last_modified': file_info['last_modified'],
-                        'r2_path': file_info['key']
-                    })
+            async for page in self.r2_client.iter_file_pages(prefix):
+                for file_info in page:
+                    if file_info['key'].endswith('.ts'):
+                        segments.append({
+                            'segment_name': file_info['key'].rsplit('/', 1)[-1],
+                            'size': file_info['size'],
+                            'last_modified': file_info['last_modified'],
+                            'r2_path': file_info['key']
+                        })
             
             self.logger.info(f"[{task_id}] 找到 {len(segments)} 个分段文件")
             return segments
@@ -227,32 +255,34 @@ class R2HLSStorageManager:
         Returns:
             Dict: 清理结果
         """
+        self.release_task(task_id)
         try:
             prefix = f"hls/{task_id}/"
-            files = await self.r2_client.list_files(prefix)
             
+            total_files = 0
             deleted_count = 0
             errors = []
             
-            for file_info in files:
-                file_path = file_info['key']
+            # 每取到一页（最多1000个）就批量删除一次，不一次性载入全部列表
+            async for page in self.r2_client.iter_file_pages(prefix):
+                total_files += len(page)
                 
                 # 如果要保留最终视频，跳过播放列表文件
-                if keep_final_video and file_path.endswith('playlist.m3u8'):
+                to_delete = [
+                    file_info['key'] for file_info in page
+                    if not (keep_final_video and file_info['key'].endswith('playlist.m3u8'))
+                ]
+                if not to_delete:
                     continue
                 
-                try:
-                    success = await self.r2_client.delete_file(file_path)
-                    if success:
-                        deleted_count += 1
-                    else:
-                        errors.append(f"删除失败: {file_path}")
-                except Exception as e:
-                    errors.append(f"删除异常 {file_path}: {e}")
+                await self._write_bucket.acquire()
+                failed = await self.r2_client.delete_files(to_delete)
+                deleted_count += len(to_delete) - len(failed)
+                errors.extend(f"删除失败 {file_path}: {message}" for file_path, message in failed.items())
             
             result = {
                 "deleted_count": deleted_count,
-                "total_files": len(files),
+                "total_files": total_files,
                 "errors": errors
             }
             
@@ -282,22 +312,31 @@ class R2HLSStorageManager:
         failed_count = 0
         errors = []
         
-        for segment_path in segment_file_paths:
-            try:
-                segment_name = Path(segment_path).name
-                result = await self.upload_segment(task_id, segment_path, segment_name)
-                
-                if result["status"] == "success":
-                    uploaded_count += 1
-                else:
-                    failed_count += 1
-                    errors.append(result.get("message", f"上传失败: {segment_name}"))
-                    
-            except Exception as e:
+        # 并发上传（由信号量限制并发数），避免单个慢分段阻塞后续分段
+        # 文件名只计算一次
+        segment_names = [os.path.basename(segment_path) for segment_path in segment_file_paths]
+        results = await asyncio.gather(
+            *[self.upload_segment(task_id, segment_path, segment_name)
+              for segment_path, segment_name in zip(segment_file_paths, segment_names)],
+            return_exceptions=True
+        )
+        
+        for segment_name, result in zip(segment_names, results):
+            if isinstance(result, Exception):
                 failed_count += 1
-                errors.append(f"上传异常 {Path(segment_path).name}: {e}")
+                errors.append(f"上传异常 {segment_name}: {result}")
+            elif result["status"] == "success":
+                uploaded_count += 1
+            else:
+                failed_count += 1
+                errors.append(result.get("message", f"上传失败: {segment_name}"))
         
-        total_count = len(segment_file_paths)
+        return self._summarize_uploads(task_id, uploaded_count, failed_count, errors)
+    
+    def _summarize_uploads(self, task_id: str, uploaded_count: int, failed_count: int,
+                           errors: List[str]) -> Dict:
+        """汇总分段上传结果"""
+        total_count = uploaded_count + failed_count
         
         if failed_count == 0:
             status = "success"
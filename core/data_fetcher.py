@@ -1,13 +1,14 @@
 import logging
 import asyncio
 import time
-from typing import List, Dict, Optional, Tuple
+from contextlib import contextmanager
+from typing import Iterator, List, Dict, Optional, Tuple
 from pathlib import Path
-import aiofiles
 
 from config import get_config
 from core.cloudflare.d1_client import D1Client
 from core.cloudflare.r2_client import R2Client
+from core.client_manager import ClientManager
 from core.sentence_tools import Sentence
 from utils.path_manager import PathManager
 from core.vocal_separator import VocalSeparator
@@ -19,28 +20,34 @@ class DataFetcher:
     
     def __init__(self, d1_client: D1Client = None, r2_client: R2Client = None):
         self.config = get_config()
-        self.logger = logging.getLogger(__name__)
+        self.logger = logger
         
-        # 使用依赖注入的客户端，如果没有则抛出异常（强制使用依赖注入）
-        if d1_client is None:
-            raise ValueError("D1Client 必须通过依赖注入提供")
-        if r2_client is None:
-            raise ValueError("R2Client 必须通过依赖注入提供")
-            
-        self.d1_client = d1_client
-        self.r2_client = r2_client
+        # 使用依赖注入的客户端，如果没有则复用全局客户端管理器中的实例，共享连接池
+        client_manager = ClientManager()
+        self.d1_client = d1_client if d1_client is not None else client_manager.get_d1_client()
+        self.r2_client = r2_client if r2_client is not None else client_manager.get_r2_client()
         
         # 初始化音频分离器
         self.vocal_separator = VocalSeparator()
         
+        # 限制同时进行的数据获取数：每个任务占用下载带宽、磁盘和分离线程
+        self._fetch_sem = asyncio.Semaphore(getattr(self.config, 'MAX_CONCURRENT_FETCHES', 2) or 2)
+        
         self.logger.info("数据获取服务初始化完成")
     
     async def fetch_task_data(self, task_id: str, path_manager: PathManager = None) -> Dict:
+        """获取任务数据，超出并发上限时排队等待（见 _fetch_task_data）"""
+        if self._fetch_sem.locked():
+            self.logger.info(f"[{task_id}] 数据获取并发已满，排队等待")
+        async with self._fetch_sem:
+            return await self._fetch_task_data(task_id, path_manager)
+    
+    async def _fetch_task_data(self, task_id: str, path_manager: PathManager = None) -> Dict:
         """
         并行化的任务数据获取 - 大幅提升数据获取性能
         
         优化策略：
-        1. D1查询并行化（句子数据 + 媒体路径）
+        1. D1单次联表查询（句子数据 + 媒体路径）
         2. R2下载并行化（音频 + 视频）
         3. 音频分离后台处理
         4. 详细性能监控
@@ -52,107 +59,74 @@ class DataFetcher:
         Returns:
             Dict: 包含句子列表和音频文件路径的字典
         """
-        start_time = time.time()
+        start_time = time.perf_counter()
+        timings: Dict[str, float] = {}
         
         try:
             self.logger.info(f"[{task_id}] 开始并行获取任务数据")
             
+            # 分离模型预热与D1查询、音频下载重叠进行
+            if getattr(self.config, 'ENABLE_VOCAL_SEPARATION', True):
+                self.vocal_separator.start_warmup()
+            
             # 创建或使用传入的路径管理器
             if path_manager is None:
                 path_manager = PathManager(task_id)
                 self.logger.warning(f"[{task_id}] DataFetcher: 未传入path_manager，创建新的")
             
-            # 阶段1: 并行执行D1查询
-            d1_start_time = time.time()
-            self.logger.info(f"[{task_id}] 开始并行D1查询")
-            
-            sentences_task = asyncio.create_task(
-                self.d1_client.get_transcription_segments_from_worker(task_id),
-                name=f"get_sentences_{task_id}"
-            )
-            media_paths_task = asyncio.create_task(
-                self.d1_client.get_worker_media_paths(task_id),
-                name=f"get_media_paths_{task_id}"
-            )
+            # 阶段1: 单次D1查询获取句子数据与媒体路径
+            self.logger.info(f"[{task_id}] 开始D1查询")
             
-            # 等待D1查询完成
-            sentences, media_paths = await asyncio.gather(
-                sentences_task, media_paths_task, return_exceptions=True
-            )
+            with self._stage('d1', timings):
+                bundle = await self.d1_client.get_task_bundle(task_id)
             
-            d1_duration = time.time() - d1_start_time
-            self.logger.info(f"[{task_id}] D1并行查询完成，耗时: {d1_duration:.2f}s")
+            self.logger.info(f"[{task_id}] D1查询完成，耗时: {timings['d1']:.2f}s")
             
             # 检查D1查询结果
-            if isinstance(sentences, Exception):
-                self.logger.error(f"[{task_id}] 获取句子数据失败: {sentences}")
-                return {"status": "error", "message": f"获取句子数据失败: {sentences}"}
+            if not bundle:
+                self.logger.error(f"[{task_id}] 获取任务数据失败")
+                return {"status": "error", "message": "获取任务数据失败"}
+            
+            sentences = bundle['sentences']
+            media_paths = bundle['media_paths']
             
-            if isinstance(media_paths, Exception):
-                self.logger.error(f"[{task_id}] 获取媒体路径失败: {media_paths}")
-                return {"status": "error", "message": f"获取媒体路径失败: {media_paths}"}
-                
             if not sentences:
                 return {"status": "error", "message": "未找到转录数据"}
             
             # 阶段2: 并行下载和处理媒体文件
-            download_start_time = time.time()
+            # 音频下载后在线程中分离，与视频下载互相重叠，总耗时约为 max(音频, 视频)
             self.logger.info(f"[{task_id}] 开始并行媒体文件下载")
             
-            download_tasks = []
+            audio_path_r2 = media_paths.audio_path
+            video_path_r2 = media_paths.video_path
+            # 两个下载任务内部已处理预期错误并返回None；意外异常时TaskGroup取消另一个并向上抛出
+            with self._stage('download', timings):
+                async with asyncio.TaskGroup() as tg:
+                    audio_task = tg.create_task(
+                        self._download_and_separate_audio(task_id, audio_path_r2, path_manager) if audio_path_r2 else self._no_media((None, None))
+                    )
+                    video_task = tg.create_task(
+                        self._download_video_file(task_id, video_path_r2, path_manager) if video_path_r2 else self._no_media(None)
+                    )
             
-            # 创建音频下载任务
-            if media_paths.get('audio_path'):
-                audio_task = asyncio.create_task(
-                    self._download_and_separate_audio(task_id, media_paths['audio_path'], path_manager),
-                    name=f"download_audio_{task_id}"
-                )
-                download_tasks.append(('audio', audio_task))
+            d1_duration, download_duration = timings['d1'], timings['download']
+            self.logger.info(f"[{task_id}] 媒体文件并行下载完成，耗时: {download_duration:.2f}s")
             
-            # 创建视频下载任务  
-            if media_paths.get('video_path'):
-                video_task = asyncio.create_task(
-                    self._download_video_file(task_id, media_paths['video_path'], path_manager),
-                    name=f"download_video_{task_id}"
-                )
-                download_tasks.append(('video', video_task))
+            # 处理下载结果
+            vocals_path, instrumental_path = audio_task.result()
+            video_file_path = video_task.result()
             
-            # 等待所有下载任务完成
-            if download_tasks:
-                download_results = await asyncio.gather(
-                    *[task for _, task in download_tasks], return_exceptions=True
-                )
-                
-                download_duration = time.time() - download_start_time
-                self.logger.info(f"[{task_id}] 媒体文件并行下载完成，耗时: {download_duration:.2f}s")
-                
-                # 处理下载结果
-                vocals_path, instrumental_path, video_file_path = None, None, None
-                
-                for i, (task_type, task) in enumerate(download_tasks):
-                    result = download_results[i]
-                    
-                    if isinstance(result, Exception):
-                        self.logger.error(f"[{task_id}] {task_type}下载失败: {result}")
-                        continue
-                    
-                    if task_type == 'audio':
-                        vocals_path, instrumental_path = result
-                        if vocals_path:
-                            self.logger.info(f"[{task_id}] 音频处理成功: vocals={vocals_path}")
-                    elif task_type == 'video':
-                        video_file_path = result
-                        if video_file_path:
-                            self.logger.info(f"[{task_id}] 视频下载成功: {video_file_path}")
-            else:
-                vocals_path, instrumental_path, video_file_path = None, None, None
+            if vocals_path:
+                self.logger.info(f"[{task_id}] 音频处理成功: vocals={vocals_path}")
+            if video_file_path:
+                self.logger.info(f"[{task_id}] 视频下载成功: {video_file_path}")
             
             # 设置媒体路径
             if vocals_path and video_file_path:
                 path_manager.set_media_paths(vocals_path, video_file_path)
             
             # 构建结果
-            total_duration = time.time() - start_time
+            total_duration = time.perf_counter() - start_time
             result = {
                 "status": "success",
                 "sentences": sentences,
@@ -165,31 +139,52 @@ class DataFetcher:
                 "performance": {
                     "total_duration": total_duration,
                     "d1_duration": d1_duration,
-                    "download_duration": download_duration if 'download_duration' in locals() else 0,
-                    "efficiency_gain": f"{((d1_duration + (download_duration if 'download_duration' in locals() else 0)) / total_duration - 1) * 100:.1f}%"
+                    "download_duration": download_duration,
+                    "efficiency_gain": f"{((d1_duration + download_duration) / total_duration - 1) * 100:.1f}%"
                 }
             }
             
             self.logger.info(
                 f"[{task_id}] 并行数据获取成功: {len(sentences)} 个句子, "
                 f"总耗时: {total_duration:.2f}s, D1: {d1_duration:.2f}s, "
-                f"下载: {download_duration if 'download_duration' in locals() else 0:.2f}s"
+                f"下载: {download_duration:.2f}s"
             )
             
             return result
             
+        except ExceptionGroup as eg:
+            # TaskGroup 将媒体阶段的意外异常包装为 ExceptionGroup，展开子异常以便定位
+            total_duration = time.perf_counter() - start_time
+            errors = "; ".join(f"{type(exc).__name__}: {exc}" for exc in eg.exceptions)
+            self.logger.error(f"[{task_id}] 媒体文件下载失败: {errors}, 耗时: {total_duration:.2f}s")
+            return {"status": "error", "message": "媒体文件下载失败"}
         except Exception as e:
-            total_duration = time.time() - start_time
+            total_duration = time.perf_counter() - start_time
             self.logger.error(f"[{task_id}] 并行获取任务数据失败: {e}, 耗时: {total_duration:.2f}s")
             return {"status": "error", "message": "数据获取失败"}
     
+    @staticmethod
+    @contextmanager
+    def _stage(name: str, timings: Dict[str, float]) -> Iterator[None]:
+        """记录代码块耗时（秒）到 timings[name]"""
+        stage_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            timings[name] = time.perf_counter() - stage_start
+    
+    @staticmethod
+    async def _no_media(default):
+        """缺少对应媒体路径时的占位结果"""
+        return default
+    
     async def _download_and_separate_audio(self, task_id: str, audio_path_r2: str, 
                                           path_manager: PathManager) -> Tuple[Optional[str], Optional[str]]:
         """
         并行优化的音频下载和分离处理
         
         优化策略：
-        1. 异步下载音频文件
+        1. 流式下载音频文件到磁盘
         2. 后台音频分离处理
         3. 智能降级策略
         
@@ -197,46 +192,41 @@ class DataFetcher:
             Tuple[vocals_path, instrumental_path]: 分离后的人声和背景音路径
         """
         try:
-            download_start_time = time.time()
+            download_start_time = time.perf_counter()
             
-            # 异步下载音频数据
+            # 直接流式下载音频到本地，不在内存中缓存完整文件
             self.logger.info(f"[{task_id}] 开始下载音频文件: {audio_path_r2}")
-            audio_data = await self.r2_client.download_audio(audio_path_r2)
+            original_audio_path = path_manager.temp.media_dir / "original_audio.wav"
             
-            if not audio_data:
+            if not await self.r2_client.download_to_file(audio_path_r2, original_audio_path):
                 self.logger.error(f"[{task_id}] 下载音频文件失败: {audio_path_r2}")
                 return None, None
             
-            download_duration = time.time() - download_start_time
-            self.logger.info(f"[{task_id}] 音频下载完成，耗时: {download_duration:.2f}s, 大小: {len(audio_data)} bytes")
-            
-            # 异步保存原始音频到本地
-            save_start_time = time.time()
-            original_audio_path = path_manager.temp.media_dir / "original_audio.wav"
-            
-            async with aiofiles.open(original_audio_path, 'wb') as f:
-                await f.write(audio_data)
-            
-            save_duration = time.time() - save_start_time
-            self.logger.info(f"[{task_id}] 音频文件保存完成，耗时: {save_duration:.2f}s")
+            download_duration = time.perf_counter() - download_start_time
+            self.logger.info(
+                f"[{task_id}] 音频下载完成，耗时: {download_duration:.2f}s, "
+                f"大小: {original_audio_path.stat().st_size} bytes"
+            )
             
             # 音频分离处理（如果启用）
             if getattr(self.config, 'ENABLE_VOCAL_SEPARATION', True) and self.vocal_separator.is_available():
                 self.logger.info(f"[{task_id}] 开始后台音频分离处理...")
-                separation_start_time = time.time()
+                separation_start_time = time.perf_counter()
                 
                 # 使用异步音频分离
                 separation_result = await self.vocal_separator.separate_complete_audio(
                     str(original_audio_path), path_manager
                 )
                 
-                separation_duration = time.time() - separation_start_time
+                separation_duration = time.perf_counter() - separation_start_time
                 
                 if separation_result['success']:
                     self.logger.info(
                         f"[{task_id}] 音频分离成功，耗时: {separation_duration:.2f}s, "
                         f"人声: {separation_result['vocals_path']}, 背景: {separation_result['instrumental_path']}"
                     )
+                    # 分离成功后原始音频不再使用，立即删除以减少任务期间的磁盘占用
+                    original_audio_path.unlink(missing_ok=True)
                     return separation_result['vocals_path'], separation_result['instrumental_path']
                 else:
                     self.logger.warning(
@@ -267,29 +257,22 @@ class DataFetcher:
             Optional[str]: 本地视频文件路径
         """
         try:
-            download_start_time = time.time()
+            download_start_time = time.perf_counter()
             
-            # 异步下载视频数据
+            # 直接流式下载视频到本地，大文件按分块并发下载
             self.logger.info(f"[{task_id}] 开始下载视频文件: {video_path_r2}")
-            video_data = await self.r2_client.download_video(video_path_r2)
-            
-            if not video_data:
-                self.logger.error(f"[{task_id}] 下载视频文件失败: {video_path_r2}")
-                return None
-            
-            download_duration = time.time() - download_start_time
-            self.logger.info(f"[{task_id}] 视频下载完成，耗时: {download_duration:.2f}s, 大小: {len(video_data)} bytes")
-            
-            # 异步保存到本地
-            save_start_time = time.time()
             video_filename = Path(video_path_r2).name
             local_video_path = path_manager.temp.media_dir / f"silent_{video_filename}"
             
-            async with aiofiles.open(local_video_path, 'wb') as f:
-                await f.write(video_data)
+            if not await self.r2_client.download_to_file(video_path_r2, local_video_path):
+                self.logger.error(f"[{task_id}] 下载视频文件失败: {video_path_r2}")
+                return None
             
-            save_duration = time.time() - save_start_time
-            self.logger.info(f"[{task_id}] 视频文件保存完成，耗时: {save_duration:.2f}s, 路径: {local_video_path}")
+            download_duration = time.perf_counter() - download_start_time
+            self.logger.info(
+                f"[{task_id}] 视频下载完成，耗时: {download_duration:.2f}s, "
+                f"大小: {local_video_path.stat().st_size} bytes, 路径: {local_video_path}"
+            )
             
             return str(local_video_path)
             
@@ -300,14 +283,13 @@ class DataFetcher:
     
     
     async def get_sentences_only(self, task_id: str) -> List[Sentence]:
-        """仅获取句子数据，不下载媒体文件"""
+        """仅获取句子数据，不下载媒体文件（句子只读，重复调用命中D1客户端的LRU缓存）"""
         try:
-            transcriptions = await self.d1_client.get_transcriptions(task_id)
-            if not transcriptions:
+            sentences = await self.d1_client.get_sentences(task_id, cached=True)
+            if not sentences:
                 self.logger.warning(f"[{task_id}] 未找到转录数据")
                 return []
             
-            sentences = await self.d1_client.to_sentence_objects(transcriptions, task_id)
             self.logger.info(f"[{task_id}] 获取到 {len(sentences)} 个句子")
             return sentences
             
@@ -321,7 +303,6 @@ class DataFetcher:
         return await self.d1_client.update_task_status(task_id, status, error_message, hls_playlist_url)
     
     async def close(self):
-        """关闭客户端连接"""
-        await self.d1_client.close()
+        """释放本服务持有的资源（共享的D1/R2客户端由 ClientManager.close_all 在应用关闭时统一关闭）"""
         if self.vocal_separator:
             await self.vocal_separator.cleanup()
\ No newline at end of file
@@ -6,13 +6,13 @@ import shutil
 import time
 import asyncio
 from pathlib import Path
-from typing import Union, Optional, Dict, List
+from typing import Union, Optional, Dict, List, Set
 
-import aiofiles
 from utils.ffmpeg_utils import hls_segment, concat_videos
 from utils.path_manager import PathManager
 from config import Config
 from core.cloudflare.d1_client import D1Client
+from core.client_manager import ClientManager
 from core.cloudflare.r2_hls_storage_manager import R2HLSStorageManager
 
 logger = logging.getLogger(__name__)
@@ -22,15 +22,11 @@ class HLSManager:
     def __init__(self, d1_client: D1Client = None):
         self.config = Config()
         
-        # 使用依赖注入的客户端，如果没有则创建新的（向后兼容）
+        # 使用依赖注入的客户端，如果没有则复用全局客户端管理器中的实例（向后兼容）
         if d1_client is not None:
             self.d1_client = d1_client
         else:
-            self.d1_client = D1Client(
-                account_id=self.config.CLOUDFLARE_ACCOUNT_ID,
-                api_token=self.config.CLOUDFLARE_API_TOKEN,
-                database_id=self.config.CLOUDFLARE_D1_DATABASE_ID
-            )
+            self.d1_client = ClientManager().get_d1_client()
         
         # 初始化R2 HLS存储管理器
         self.hls_storage_manager = R2HLSStorageManager(config=self.config)
@@ -47,8 +43,24 @@ class HLSManager:
         self.upload_workers = {}  # 每个任务的上传工作器
         self.upload_semaphore = asyncio.Semaphore(3)  # 限制并发上传数
         
+        # 不需要等待结果的后台任务（如状态更新），保留强引用防止被回收，并记录其异常
+        self._background_tasks: Set[asyncio.Task] = set()
+        
         self.logger.info("HLS管理器已初始化（支持并行上传优化）")
 
+    def _spawn_background(self, coro, description: str) -> asyncio.Task:
+        """启动不等待结果的后台任务，完成后自动移除并记录异常"""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        
+        def on_done(t: asyncio.Task) -> None:
+            self._background_tasks.discard(t)
+            if not t.cancelled() and t.exception() is not None:
+                self.logger.error(f"{description}失败: {t.exception()}")
+        
+        task.add_done_callback(on_done)
+        return task
+    
     async def create_manager(self, task_id: str, path_manager: PathManager) -> Dict:
         """
         为特定任务创建HLS管理器
@@ -129,10 +141,10 @@ class HLSManager:
                 error_message = f"为任务 {task_id} 创建HLS管理器失败: {e}"
                 self.logger.error(error_message)
                 # Update D1 task status to error
-                try:
-                    asyncio.create_task(self.d1_client.update_task_status(task_id, 'error', f"HLS管理器初始化失败: {e}"))
-                except Exception as db_update_e:
-                    self.logger.error(f"任务 {task_id}: 更新数据库状态失败 (HLS创建失败时): {db_update_e}")
+                self._spawn_background(
+                    self.d1_client.update_task_status(task_id, 'error', f"HLS管理器初始化失败: {e}"),
+                    f"任务 {task_id}: 更新数据库状态 (HLS创建失败时)"
+                )
 
                 # 清理已创建的部分资源
                 if task_id in self.task_managers:
@@ -456,19 +468,28 @@ class HLSManager:
             # 确保目录存在
             playlist_path.parent.mkdir(parents=True, exist_ok=True)
             
-            # 使用asyncio.to_thread避免阻塞
-            await asyncio.to_thread(self._write_playlist, playlist, playlist_path)
+            # 使用asyncio.to_thread避免阻塞；保留编码后的内容供上传复用，避免重复序列化
+            manager["playlist_bytes"] = await asyncio.to_thread(self._write_playlist, playlist, playlist_path)
                 
             self.logger.info(f"播放列表已更新，总计{len(playlist.segments)}个分段, 任务ID={task_id}")
         except Exception as e:
             self.logger.error(f"保存播放列表失败: {e}, 任务ID={task_id}")
             raise
     
-    def _write_playlist(self, playlist, playlist_path):
-        """同步写入播放列表文件"""
-        with open(playlist_path, 'w', encoding='utf-8') as f:
-            content = playlist.dumps()
-            f.write(content)
+    def _write_concat_list(self, list_txt_path: Path, segment_paths: List[str]) -> None:
+        """同步写入ffmpeg合并列表文件（一次写入）"""
+        lines = []
+        for seg_mp4 in segment_paths:
+            # 确保路径是绝对的并且格式正确
+            formatted_path = str(Path(seg_mp4).resolve()).replace("\\", "/")
+            lines.append(f"file '{formatted_path}'\n")
+        list_txt_path.write_text(''.join(lines), encoding='utf-8')
+    
+    def _write_playlist(self, playlist, playlist_path) -> bytes:
+        """同步写入播放列表文件，返回写入的UTF-8内容"""
+        content = playlist.dumps().encode('utf-8')
+        playlist_path.write_bytes(content)
+        return content
     
     async def _upload_playlist_to_storage(self, task_id: str) -> None:
         """
@@ -484,8 +505,8 @@ class HLSManager:
             manager = self.task_managers[task_id]
             playlist = manager["playlist"]
             
-            # 获取播放列表内容
-            playlist_content = playlist.dumps()
+            # 获取播放列表内容（每次修改后都会先保存，直接复用保存时编码好的内容）
+            playlist_content = manager.get("playlist_bytes") or playlist.dumps().encode('utf-8')
             
             # 上传到R2存储
             upload_result = await self.hls_storage_manager.upload_playlist(task_id, playlist_content)
@@ -495,13 +516,11 @@ class HLSManager:
                 
                 # 更新数据库中的HLS播放列表URL为R2的公共URL
                 storage_url = upload_result["public_url"]
-                try:
-                    asyncio.create_task(self.d1_client.update_task_status(
-                        task_id, 'processing'
-                    ))
-                    self.logger.info(f"[{task_id}] 任务状态已更新，HLS播放列表已上传到R2: {storage_url}")
-                except Exception as update_e:
-                    self.logger.error(f"[{task_id}] 更新任务状态失败: {update_e}")
+                self._spawn_background(
+                    self.d1_client.update_task_status(task_id, 'processing'),
+                    f"[{task_id}] 更新任务状态"
+                )
+                self.logger.info(f"[{task_id}] 任务状态已更新，HLS播放列表已上传到R2: {storage_url}")
             else:
                 self.logger.error(f"[{task_id}] 播放列表上传到R2失败: {upload_result.get('message', 'Unknown error')}")
                 
@@ -690,6 +709,7 @@ class HLSManager:
                         del self.task_managers[task_id]
                         cleaned_count += 1
                 del self.locks[task_id]
+            self.hls_storage_manager.release_task(task_id)
         
         self.logger.info(f"已清理 {cleaned_count} 个过期任务的HLS资源")
         return {"status": "success", "cleaned_count": cleaned_count}
@@ -705,6 +725,8 @@ class HLSManager:
         # 等待所有并行上传完成
         await self._wait_for_uploads_completion(task_id)
         self.logger.info(f"[{task_id}] HLSManager: 所有并行上传已完成。")
+        # 播放列表已定稿，不再需要其ETag缓存
+        self.hls_storage_manager.release_task(task_id)
 
         # 2. 合并处理好的视频片段
         self.logger.info(f"[{task_id}] HLSManager: 开始合并 {len(all_processed_segment_paths)} 个视频片段。")
@@ -723,11 +745,7 @@ class HLSManager:
             
             # 创建合并列表文件
             list_txt_path = path_manager.temp.processing_dir / "concat_list.txt"
-            async with aiofiles.open(list_txt_path, "w", encoding='utf-8') as f:
-                for seg_mp4 in all_processed_segment_paths:
-                    # 确保路径是绝对的并且格式正确
-                    formatted_path = str(Path(seg_mp4).resolve()).replace("\\", "/")
-                    await f.write(f"file '{formatted_path}'\n")
+            await asyncio.to_thread(self._write_concat_list, list_txt_path, all_processed_segment_paths)
             self.logger.info(f"[{task_id}] HLSManager: 合并列表文件已创建: {list_txt_path}")
 
             # 执行视频合并
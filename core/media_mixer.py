@@ -182,10 +182,6 @@ class MediaMixer:
             
             logger.info(f"[{task_id}] 批次 {batch_counter} 处理完成")
             
-            # 清理临时变量
-            if 'updated_buffer' in locals() and updated_buffer is not self.full_audio_buffer:
-                del updated_buffer
-            
             # 定期强制垃圾回收（保留这个机制以提高内存效率）
             if batch_counter % self.cleanup_interval == 0:
                 gc.collect()
@@ -278,11 +274,8 @@ async def create_mixed_segment(
             logger.warning(f"[{task_id}] create_mixed_segment: video_width or video_height not found or invalid in media_files. Defaulting or skipping scaling.")
             # Potentially set to a default or handle error, for now, it will pass -1
 
-        updated_audio_buffer = np.concatenate((full_audio_buffer, full_audio))
-        
-        # 滑动窗口优化：只保留最后N秒的音频
-        if len(updated_audio_buffer) > max_buffer_samples:
-            updated_audio_buffer = updated_audio_buffer[-max_buffer_samples:]
+        # 滑动窗口优化：只保留最后N秒的音频（新分配窗口，不持有拼接后完整数组的视图）
+        updated_audio_buffer = _append_to_window(full_audio_buffer, full_audio, max_buffer_samples)
 
         await add_video_segment(
             video_path=video_path,
@@ -298,31 +291,44 @@ async def create_mixed_segment(
             video_height=video_height    # Pass video_height
         )
         
+        # 混合音频已写入视频片段，尽早释放
+        del full_audio
+        
         return True, updated_audio_buffer
         
     except Exception as e:
         logger.exception(f"[{task_id}] create_mixed_segment 执行出错，错误: {e}")
         return False, full_audio_buffer
-    finally:
-        if 'full_audio' in locals() and full_audio is not None and full_audio is not updated_audio_buffer: 
-            del full_audio
+
+def _append_to_window(buffer: np.ndarray, new_audio: np.ndarray, max_samples: int) -> np.ndarray:
+    """将新音频追加到滑动窗口缓冲区，只分配并保留最后 max_samples 个采样"""
+    keep = min(len(buffer) + len(new_audio), max_samples)
+    window = np.empty(keep, dtype=np.float32)
+    from_new = min(len(new_audio), keep)
+    from_old = keep - from_new
+    if from_old > 0:
+        window[:from_old] = buffer[len(buffer) - from_old:]
+    window[from_old:] = new_audio[len(new_audio) - from_new:]
+    return window
 
 def _concat_audio_segments(sentences: List[Sentence], full_audio_buffer: np.ndarray, overlap: float) -> np.ndarray:
-    """拼接所有句子的合成音频"""
-    full_audio = np.array([], dtype=np.float32)
+    """拼接所有句子的合成音频（先收集各段，最后一次性拼接）"""
+    parts = []
     for sentence in sentences:
         if sentence.generated_audio is not None and len(sentence.generated_audio) > 0:
             audio_data = np.asarray(sentence.generated_audio, dtype=np.float32)
-            if len(full_audio) > 0:
+            if parts:
                 audio_data = apply_fade_effect(audio_data, full_audio_buffer, overlap)
-            full_audio = np.concatenate((full_audio, audio_data))
+            parts.append(audio_data)
         else:
             logger.warning(
                 "句子音频生成失败或为空: text=%r, UUID=%s",
                 sentence.original_text,
                 sentence.model_input.get("uuid", "unknown")
             )
-    return full_audio
+    if not parts:
+        return np.array([], dtype=np.float32)
+    return np.concatenate(parts)
 
 def _calculate_time_params(sentences: List[Sentence]) -> tuple:
     """计算时间参数"""
@@ -338,17 +344,13 @@ async def _process_background_audio(
     sample_rate: int, vocals_volume: float, background_volume: float, max_val: float
 ) -> np.ndarray:
     """处理背景音频 - 异步版本"""
-    try:
-        mixed_audio = await mix_with_background(
-            bg_path=bg_path,
-            start_time=start_time,
-            duration=duration,
-            audio_data=audio_data,
-            sample_rate=sample_rate,
-            vocals_volume=vocals_volume,
-            background_volume=background_volume
-        )
-        return normalize_audio(mixed_audio, max_val)
-    finally:
-        if 'mixed_audio' in locals():
-            del mixed_audio
+    mixed_audio = await mix_with_background(
+        bg_path=bg_path,
+        start_time=start_time,
+        duration=duration,
+        audio_data=audio_data,
+        sample_rate=sample_rate,
+        vocals_volume=vocals_volume,
+        background_volume=background_volume
+    )
+    return normalize_audio(mixed_audio, max_val)
@@ -4,7 +4,7 @@ import sys
 import logging
 import asyncio
 import gc
-from typing import List, AsyncGenerator
+from typing import List, AsyncGenerator, AsyncIterable, AsyncIterator, Union
 
 import torch
 import numpy as np
@@ -14,6 +14,13 @@ from pathlib import Path
 # 全局 logger
 logger = logging.getLogger(__name__)
 
+
+async def _aiter_list(items: List) -> AsyncIterator:
+    """将列表包装为异步迭代器，与流式输入共用同一处理循环"""
+    for item in items:
+        yield item
+
+
 class MyIndexTTSDeployment:
     """
     提供流式 TTS 服务
@@ -65,20 +72,25 @@ class MyIndexTTSDeployment:
         if torch.cuda.is_available():
             torch.cuda.empty_cache()
 
-    async def generate_audio_stream(self, sentences: List, path_manager=None) -> AsyncGenerator[List, None]:
+    async def generate_audio_stream(self, sentences: Union[List, AsyncIterable], path_manager=None) -> AsyncGenerator[List, None]:
         """
         为句子列表生成音频流
         
         Args:
-            sentences: 句子列表
+            sentences: 句子列表，或按顺序逐句产出句子的异步迭代器（上游边切分边合成）
             path_manager: 共享的路径管理器（可选）
         """
-        if not sentences:
-            logger.warning("TTS: 没有可处理的句子，跳过生成。")
-            return
-
-        task_id = getattr(sentences[0], 'task_id', 'unknown') if sentences else 'unknown'
-        logger.info(f"TTS: 开始为 {len(sentences)} 个句子生成音频 (任务: {task_id})")
+        if isinstance(sentences, list):
+            if not sentences:
+                logger.warning("TTS: 没有可处理的句子，跳过生成。")
+                return
+            task_id = getattr(sentences[0], 'task_id', 'unknown')
+            logger.info(f"TTS: 开始为 {len(sentences)} 个句子生成音频 (任务: {task_id})")
+            sentence_iter = _aiter_list(sentences)
+        else:
+            task_id = 'unknown'
+            logger.info("TTS: 开始流式生成音频（句子随上游切分逐个到达）")
+            sentence_iter = sentences
         
         # 使用传入的path_manager，如果没有则创建新的（向后兼容）
         if path_manager is None:
@@ -95,7 +107,7 @@ class MyIndexTTSDeployment:
 
         # 批量生成音频
         batch = []
-        for sentence in sentences:
+        async for sentence in sentence_iter:
             try:
                 async with self._lock:
                     res = await asyncio.to_thread(
@@ -114,7 +126,8 @@ class MyIndexTTSDeployment:
                 sentence.duration = 0.0
             else:
                 sr, wav_np = res
-                wav_flat = wav_np.flatten().astype(np.float32) / 32767.0
+                # 一次分配完成 int16 → float32 转换与缩放（reshape 对连续数据不拷贝）
+                wav_flat = np.divide(wav_np.reshape(-1), 32767.0, dtype=np.float32)
                 sentence.generated_audio = wav_flat
                 sentence.duration = len(wav_flat) / sr * 1000
                 
@@ -4,9 +4,11 @@
 import logging
 import asyncio
 import os
+import tempfile
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Optional
 import gc
+from concurrent.futures import ThreadPoolExecutor
 import torch
 
 try:
@@ -47,6 +49,16 @@ class VocalSeparator:
         self.use_gpu = torch.cuda.is_available()
         self.logger.info(f"GPU可用性: {self.use_gpu}")
         
+        # 分离专用单线程执行器：模型实例只有一份，分离任务串行执行，
+        # 且长时间运行的分离不会占用 asyncio.to_thread 使用的默认I/O线程池
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vocal_separator")
+        # 执行器槽位：持有者的分离任务正在（或即将）占用唯一的工作线程，
+        # 直到线程中的分离真正结束才释放，排队等待的时间不计入超时
+        self._slot = asyncio.Lock()
+        
+        # 预热状态：首次推理需创建推理会话/编译CUDA内核，提前用短静音触发
+        self._warmup_future: Optional[asyncio.Future] = None
+        
         # 初始化分离器
         try:
             # 暂时禁用autocast避免API兼容性问题
@@ -70,6 +82,39 @@ class VocalSeparator:
         """检查分离器是否可用"""
         return AUDIO_SEPARATOR_AVAILABLE and self.separator is not None
     
+    def start_warmup(self) -> None:
+        """
+        在分离专用线程中启动一次预热推理（幂等，不等待完成）
+        
+        执行器为单线程，之后提交的分离任务会自动排在预热之后执行。
+        """
+        if not self.is_available() or self._warmup_future is not None:
+            return
+        
+        loop = asyncio.get_running_loop()
+        self._warmup_future = loop.run_in_executor(self._executor, self._warmup_sync)
+        
+        def on_done(future: asyncio.Future) -> None:
+            if not future.cancelled() and future.exception() is not None:
+                self.logger.warning(f"VocalSeparator预热失败: {future.exception()}")
+        
+        self._warmup_future.add_done_callback(on_done)
+    
+    def _warmup_sync(self) -> None:
+        """同步执行预热：分离一段1秒静音并删除输出"""
+        import soundfile as sf
+        import numpy as np
+        
+        with tempfile.TemporaryDirectory(prefix="separator_warmup_") as temp_dir:
+            warmup_path = os.path.join(temp_dir, "warmup.wav")
+            sf.write(warmup_path, np.zeros(self.sample_rate, dtype=np.float32), self.sample_rate)
+            output_files = self.separator.separate(warmup_path) or []
+        
+        for file_path in output_files:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        self.logger.info("VocalSeparator预热完成")
+    
     async def separate_complete_audio(self, audio_path: str, path_manager: PathManager) -> Dict:
         """
         对完整音频进行人声和背景音分离
@@ -108,11 +153,8 @@ class VocalSeparator:
             # 获取输出目录
             output_dir = path_manager.temp.separated_dir
             
-            # 异步执行分离
-            separation_result = await asyncio.wait_for(
-                self._separate_audio_async(audio_path, str(output_dir)),
-                timeout=self.timeout
-            )
+            # 异步执行分离（超时从分离实际开始时计算）
+            separation_result = await self._separate_audio_async(audio_path, str(output_dir))
             
             if separation_result['success']:
                 # 更新路径管理器
@@ -148,8 +190,23 @@ class VocalSeparator:
             self._cleanup_memory()
     
     async def _separate_audio_async(self, audio_path: str, output_dir: str) -> Dict:
-        """异步执行音频分离"""
-        return await asyncio.to_thread(self._separate_audio_sync, audio_path, output_dir)
+        """
+        异步执行音频分离
+        
+        先取得执行器槽位并等待预热结束，再提交分离并开始计时；超时后线程中的分离
+        仍会运行到结束，槽位随之释放，后续任务不会因排在它后面而被误判超时。
+        """
+        await self._slot.acquire()
+        try:
+            if self._warmup_future is not None and not self._warmup_future.done():
+                await asyncio.wait([self._warmup_future])
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._executor, self._separate_audio_sync, audio_path, output_dir)
+        except BaseException:
+            self._slot.release()
+            raise
+        future.add_done_callback(lambda _: self._slot.release())
+        return await asyncio.wait_for(asyncio.shield(future), timeout=self.timeout)
     
     def _separate_audio_sync(self, audio_path: str, output_dir: str) -> Dict:
         """同步执行音频分离"""
@@ -255,6 +312,8 @@ class VocalSeparator:
             if self.separator:
                 # audio-separator可能不需要显式清理
                 pass
+            if getattr(self, '_executor', None):
+                self._executor.shutdown(wait=False, cancel_futures=True)
             self._cleanup_memory()
             self.logger.info("VocalSeparator资源清理完成")
         except Exception as e:
@@ -7,10 +7,10 @@ import asyncio
 import time
 import gc
 import torch
-from typing import Dict, List, Tuple
+from typing import AsyncIterator, Awaitable, Dict, List, Optional, Tuple
 
 from config import get_config
-from core.cloudflare.d1_client import D1Client
+from core.client_manager import ClientManager
 from utils.path_manager import PathManager
 from utils.async_utils import BackgroundTaskManager, async_retry
 
@@ -30,18 +30,17 @@ class MainOrchestrator:
         # 从服务管理器获取D1客户端
         self.d1_client = self.services.get('d1_client')
         if not self.d1_client:
-            # 如果services中没有d1_client，创建一个（向后兼容）
-            self.d1_client = D1Client(
-                account_id=self.config.CLOUDFLARE_ACCOUNT_ID,
-                api_token=self.config.CLOUDFLARE_API_TOKEN,
-                database_id=self.config.CLOUDFLARE_D1_DATABASE_ID
-            )
+            # 如果services中没有d1_client，复用全局客户端管理器中的实例（向后兼容）
+            self.d1_client = ClientManager().get_d1_client()
         
         # 直接使用服务实例（移除流水线框架）
         
         # 创建后台任务管理器
         self.task_manager = BackgroundTaskManager()
         
+        # 进行中的流水线：同一任务的重复启动请求共享同一次执行结果
+        self._inflight_pipelines: Dict[str, asyncio.Future] = {}
+        
         self.logger.info("MainOrchestrator初始化完成，所有服务实例已就绪")
     
     @async_retry(max_attempts=3, delay=1.0, backoff=2.0)
@@ -87,12 +86,27 @@ class MainOrchestrator:
         """
         执行完整的TTS流水线 - 直接集成所有步骤，移除流水线框架
         
+        同一任务已在执行时（重试、重复请求），后来的调用直接等待进行中的那次结果，
+        不会重复下载、分离、切分和合成，也不会并发写入同一任务的状态和存储。
+        
         Args:
             task_id: 任务ID
             
         Returns:
             Dict: 处理结果，与原版API兼容
         """
+        future = self._inflight_pipelines.get(task_id)
+        if future is None:
+            future = asyncio.ensure_future(self._run_pipeline(task_id))
+            self._inflight_pipelines[task_id] = future
+            future.add_done_callback(lambda _: self._inflight_pipelines.pop(task_id, None))
+        else:
+            self.logger.info(f"[{task_id}] 任务已在执行中，等待进行中的流水线结果")
+        # shield：某个调用方被取消时不影响进行中的流水线和其他等待者
+        return await asyncio.shield(future)
+    
+    async def _run_pipeline(self, task_id: str) -> Dict:
+        """执行一次完整的TTS流水线"""
         start_time = time.time()
         self.logger.info(f"[{task_id}] 开始完整TTS流程")
         
@@ -101,29 +115,38 @@ class MainOrchestrator:
         self.logger.info(f"[{task_id}] 创建统一的PathManager: {path_manager.temp.temp_dir}")
         
         try:
-            # 更新任务状态
-            await self._update_task_status(task_id, 'processing')
-            
             # 步骤1: 获取任务数据（包含音频分离）
+            # 状态写入与数据获取并行，不让D1写往返阻塞媒体下载；
+            # 等两者都结束后再继续，保证失败时的error状态一定写在processing之后
             self.logger.info(f"[{task_id}] 步骤1: 获取任务数据和音频分离")
-            task_data = await self._fetch_task_data(task_id, path_manager)
-            
-            # 步骤2: 音频切分 - 传递path_manager
-            self.logger.info(f"[{task_id}] 步骤2: 音频切分")
-            segmented_sentences = await self._segment_audio(
+            status_result, task_data = await asyncio.gather(
+                self._update_task_status(task_id, 'processing'),
+                self._fetch_task_data(task_id, path_manager),
+                return_exceptions=True
+            )
+            # 与串行执行时一致：状态写入失败优先上报
+            if isinstance(status_result, Exception):
+                raise status_result
+            if isinstance(task_data, Exception):
+                raise task_data
+            
+            # 步骤2: 音频切分 - 切分完成的句子按顺序流式送入TTS，无需等待全部切片
+            self.logger.info(f"[{task_id}] 步骤2: 流式音频切分")
+            sentence_stream = self._segment_audio_stream(
                 task_id, task_data['audio_file_path'], task_data['sentences'], path_manager
             )
             
-            # 步骤3: 初始化HLS管理器 - 使用已创建的path_manager
+            # 步骤3: 初始化HLS管理器 - 在后台进行，与音频切分和首批TTS生成重叠
             self.logger.info(f"[{task_id}] 步骤3: 初始化HLS管理器")
-            await self._init_hls_manager(
+            hls_init_task = asyncio.create_task(self._init_hls_manager(
                 task_id, task_data['audio_file_path'], task_data['video_file_path'], path_manager
-            )
+            ))
             
             # 步骤4: TTS流处理
             self.logger.info(f"[{task_id}] 步骤4: TTS流处理")
             result = await self._process_tts_stream(
-                task_id, segmented_sentences, task_data['video_file_path'], path_manager
+                task_id, task_data['sentences'], task_data['video_file_path'], path_manager,
+                sentence_stream=sentence_stream, hls_ready=hls_init_task
             )
             
             # 处理结果
@@ -239,8 +262,12 @@ class MainOrchestrator:
             self.logger.error(f"[{task_id}] 获取任务数据异常: {e}")
             raise
     
-    async def _segment_audio(self, task_id: str, audio_file_path: str, sentences: list, path_manager: PathManager) -> list:
-        """音频切分 - 替代SegmentAudioStep
+    def _segment_audio_stream(self, task_id: str, audio_file_path: str, sentences: list,
+                              path_manager: PathManager) -> AsyncIterator:
+        """音频切分 - 替代SegmentAudioStep，返回按输入顺序逐句产出切分结果的异步迭代器
+        
+        输入为空时立即失败；切分过程中的异常或没有产出任何句子时，
+        迭代器抛出"音频切分失败"，不会被当作普通的TTS错误。
         
         Args:
             task_id: 任务ID
@@ -248,24 +275,26 @@ class MainOrchestrator:
             sentences: 句子列表
             path_manager: 共享的路径管理器
         """
-        try:
-            audio_segmenter = self.services.get('audio_segmenter')
-            if not audio_segmenter:
-                raise ValueError("audio_segmenter服务未找到")
-            
-            segmented_sentences = await audio_segmenter.segment_audio_for_sentences(
-                task_id, audio_file_path, sentences, path_manager
-            )
-            
-            if not segmented_sentences:
+        audio_segmenter = self.services.get('audio_segmenter')
+        if not audio_segmenter:
+            raise ValueError("audio_segmenter服务未找到")
+        if not sentences:
+            raise ValueError("音频切分失败: 没有可切分的句子")
+        
+        async def stream() -> AsyncIterator:
+            count = 0
+            try:
+                async for sentence in audio_segmenter.iter_sentences_in_order(
+                    task_id, audio_file_path, sentences, path_manager
+                ):
+                    count += 1
+                    yield sentence
+            except Exception as e:
+                raise ValueError(f"音频切分失败: {e}") from e
+            if not count:
                 raise ValueError("音频切分失败")
-            
-            self.logger.info(f"[{task_id}] 音频切分完成，处理了 {len(segmented_sentences)} 个句子")
-            return segmented_sentences
-            
-        except Exception as e:
-            self.logger.error(f"[{task_id}] 音频切分异常: {e}")
-            raise
+        
+        return stream()
     
     async def _init_hls_manager(self, task_id: str, audio_file_path: str, video_file_path: str, path_manager: PathManager) -> None:
         """初始化HLS管理器 - 替代InitHLSStep
@@ -297,8 +326,16 @@ class MainOrchestrator:
             self.logger.error(f"[{task_id}] 初始化HLS管理器异常: {e}")
             raise
     
-    async def _process_tts_stream(self, task_id: str, sentences: list, video_file_path: str, path_manager: PathManager) -> Dict:
-        """TTS流处理 - 使用生产者-消费者模式解耦TTS生成与后续处理"""
+    async def _process_tts_stream(self, task_id: str, sentences: list, video_file_path: str, path_manager: PathManager,
+                                  sentence_stream: Optional[AsyncIterator] = None,
+                                  hls_ready: Optional[Awaitable] = None) -> Dict:
+        """TTS流处理 - 使用生产者-消费者模式解耦TTS生成与后续处理
+        
+        Args:
+            sentence_stream: 按顺序产出切分完成句子的异步迭代器（可选，提供时TTS边切分边生成）
+            hls_ready: HLS管理器初始化的可等待对象（可选），消费者在其完成后才开始添加分段
+        """
+        producer_task = None
         try:
             # 获取服务实例
             tts = self.services.get('tts')
@@ -317,10 +354,14 @@ class MainOrchestrator:
             
             # 并发启动TTS生产者和处理消费者
             producer_task = asyncio.create_task(
-                self._tts_producer(task_id, tts, sentences, path_manager, tts_queue),
+                self._tts_producer(task_id, tts, sentences, path_manager, tts_queue, sentence_stream),
                 name=f"tts_producer_{task_id}"
             )
             
+            # TTS生产者先行启动；HLS管理器就绪后才启动处理消费者
+            if hls_ready is not None:
+                await hls_ready
+            
             consumer_task = asyncio.create_task(
                 self._processing_consumer(
                     task_id, tts_queue, video_file_path, path_manager,
@@ -333,7 +374,16 @@ class MainOrchestrator:
             self.logger.info(f"[{task_id}] TTS生产者和处理消费者并发启动")
             concurrent_start_time = time.time()
             
-            # 使用gather监控并发执行
+            # 任一方先失败时立即取消另一方：生产者异常时不再处理注定作废的剩余批次，
+            # 消费者失败时生产者不会阻塞在已满的队列上
+            done, _ = await asyncio.wait(
+                {producer_task, consumer_task}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if producer_task in done and producer_task.exception() is not None:
+                consumer_task.cancel()
+            elif consumer_task in done and (consumer_task.exception() is not None or not consumer_task.result()[0]):
+                producer_task.cancel()
+            
             producer_result, consumer_result = await asyncio.gather(
                 producer_task, consumer_task, return_exceptions=True
             )
@@ -376,6 +426,10 @@ class MainOrchestrator:
                 
         except Exception as e:
             self.logger.error(f"[{task_id}] 解耦TTS流处理异常: {e}")
+            if producer_task is not None and not producer_task.done():
+                producer_task.cancel()
+            if isinstance(hls_ready, asyncio.Future) and not hls_ready.done():
+                hls_ready.cancel()
             return {"status": "error", "message": f"TTS流处理失败: {e}"}
     
     async def _process_single_batch(self, task_id: str, batch: list, batch_counter: int,
@@ -429,7 +483,7 @@ class MainOrchestrator:
             return None
 
     async def _tts_producer(self, task_id: str, tts_service, sentences: List, path_manager: PathManager, 
-                           tts_queue: asyncio.Queue) -> None:
+                           tts_queue: asyncio.Queue, sentence_stream: Optional[AsyncIterator] = None) -> None:
         """
         TTS生产者协程 - 专门负责TTS音频生成，将完成的批次放入队列
         
@@ -439,6 +493,7 @@ class MainOrchestrator:
             sentences: 句子列表
             path_manager: 路径管理器
             tts_queue: 异步队列，用于传递TTS完成的批次
+            sentence_stream: 逐句产出的输入流（可选，提供时代替句子列表作为TTS输入）
         """
         start_time = time.time()
         batch_counter = 0
@@ -448,7 +503,8 @@ class MainOrchestrator:
             self.logger.info(f"[{task_id}] TTS生产者启动，待处理句子数: {len(sentences)}")
             
             # 使用TTS生成器逐批次生成音频
-            async for tts_batch in tts_service.generate_audio_stream(sentences, path_manager):
+            tts_input = sentence_stream if sentence_stream is not None else sentences
+            async for tts_batch in tts_service.generate_audio_stream(tts_input, path_manager):
                 if not tts_batch:
                     continue
                 
@@ -3,6 +3,7 @@
 """
 import asyncio
 import logging
+import time
 from typing import Set, Callable, Any, Optional
 from functools import wraps
 
@@ -105,6 +106,43 @@ class BackgroundTaskManager:
         await self.close()
 
 
+class AsyncTokenBucket:
+    """异步令牌桶限速器 - 主动控制请求速率，避免触发服务端限流"""
+    
+    def __init__(self, rate: float, burst: float):
+        """
+        Args:
+            rate: 每秒补充的令牌数
+            burst: 桶容量（允许的突发请求数）
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._last = time.monotonic()
+    
+    async def acquire(self, tokens: float = 1.0) -> None:
+        """获取令牌，不足时等待到令牌补足为止"""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        
+        # 先预留令牌（允许为负），再按欠额等待，并发调用方按顺序依次排开
+        self._tokens -= tokens
+        if self._tokens < 0:
+            await asyncio.sleep(-self._tokens / self.rate)
+    
+    def drain(self, duration: float) -> None:
+        """
+        清空令牌并预扣 duration 秒的补充量，使所有调用方在此期间暂停发起请求（用于服务端限流反馈）
+        
+        欠额取当前欠额与 duration 对应欠额中的较大者，多个并发请求同时收到限流时不会累加暂停时间。
+        """
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        self._tokens = min(self._tokens, -duration * self.rate)
+
+
 def async_retry(
     max_attempts: int = 3,
     delay: float = 1.0,
@@ -85,40 +85,43 @@ async def mix_with_background(
     Returns:
         混合后的音频数据
     """
-    try: # 添加 try...except 来捕获 sf.read 的潜在错误
-        # 异步读取背景音乐
-        background_audio, sr = await asyncio.to_thread(sf.read, bg_path)
-        logger.debug(f"mix_with_background: 读取背景音频: {bg_path}, 长度: {len(background_audio)}, 采样率: {sr}") # 使用 debug 级别
-        background_audio = np.asarray(background_audio, dtype=np.float32)
+    target_length = int(duration * sample_rate)
+    start_sample = int(start_time * sample_rate)
+    end_sample   = start_sample + target_length
+
+    try: # 添加 try...except 来捕获 sf.info / sf.read 的潜在错误
+        # 先读取文件头获取帧数、声道和采样率，无需解码全部PCM
+        info = await asyncio.to_thread(sf.info, bg_path)
+        sr = info.samplerate
+        logger.debug(f"mix_with_background: 背景音频信息: {bg_path}, 帧数: {info.frames}, 采样率: {sr}") # 使用 debug 级别
         
         # 验证音频格式（VocalSeparator已确保单声道输出）
-        if background_audio.ndim != 1:
-            logger.error(f"mix_with_background: 背景音频格式异常 {background_audio.shape}，期望单声道")
+        if info.channels != 1:
+            logger.error(f"mix_with_background: 背景音频格式异常 (channels={info.channels})，期望单声道")
             return audio_data * vocals_volume  # 降级处理，只返回人声
-        logger.debug(f"mix_with_background: 背景音频格式正确 {background_audio.shape}")
         if sr != sample_rate:
             logger.warning(
                 f"背景音采样率={sr} 与目标={sample_rate}不匹配, 未做重采样, 可能有问题."
             )
+        
+        # 只解码 [start_sample, end_sample) 窗口内的背景音
+        stop_sample = min(end_sample, info.frames)
+        if start_sample < stop_sample:
+            bg_segment, _ = await asyncio.to_thread(
+                sf.read, bg_path, start=start_sample, stop=stop_sample, dtype='float32'
+            )
+        else:
+            bg_segment = np.array([], dtype=np.float32)
+        logger.debug(f"mix_with_background: 读取背景音频片段: {bg_path}, 长度: {len(bg_segment)}")
     except Exception as e:
         logger.error(f"mix_with_background: 读取背景音频失败: {bg_path}, 错误: {e}", exc_info=True)
         # 如果读取失败，直接返回原始人声音频（应用音量）
-        target_length = int(duration * sample_rate)
         result = np.zeros(target_length, dtype=np.float32)
         audio_len = min(len(audio_data), target_length)
         if audio_len > 0:
              result[:audio_len] = audio_data[:audio_len] * vocals_volume
         return result
 
-    target_length = int(duration * sample_rate)
-    start_sample = int(start_time * sample_rate)
-    end_sample   = start_sample + target_length
-
-    if end_sample <= len(background_audio):
-        bg_segment = background_audio[start_sample:end_sample]
-    else:
-        bg_segment = background_audio[start_sample:]
-
     result = np.zeros(target_length, dtype=np.float32)
     audio_len = min(len(audio_data), target_length)
     bg_len    = min(len(bg_segment), target_length)
@@ -126,7 +129,9 @@ async def mix_with_background(
     # 混合人声 & 背景
     if audio_len > 0:
         result[:audio_len] = audio_data[:audio_len] * vocals_volume
-        logger.warning(f"mix_with_background: 添加人声后 result 最大绝对值: {np.max(np.abs(result)):.4f} (vocals_volume={vocals_volume:.2f})")
+        # 峰值统计需遍历整段音频，仅在调试级别开启时计算
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"mix_with_background: 添加人声后 result 最大绝对值: {np.max(np.abs(result)):.4f} (vocals_volume={vocals_volume:.2f})")
     else:
          logger.warning("mix_with_background: 人声音频长度为 0")
 
@@ -139,7 +144,8 @@ async def mix_with_background(
             # 直接按背景音量系数缩放并混合背景音
             bg_scaled = bg_segment[:bg_len] * background_volume
             result[:bg_len] += bg_scaled
-            logger.debug(f"mix_with_background: 混合背景音后 result 最大绝对值: {np.max(np.abs(result)):.4f} (background_volume={background_volume:.2f})")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"mix_with_background: 混合背景音后 result 最大绝对值: {np.max(np.abs(result)):.4f} (background_volume={background_volume:.2f})")
     else:
         logger.warning("mix_with_background: 背景音频片段长度为 0，不进行混合")
 
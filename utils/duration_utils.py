@@ -10,6 +10,15 @@ from config import Config
 
 logger = logging.getLogger(__name__)
 
+def _pad_silence(audio: np.ndarray, silence_samples: int, position: str) -> np.ndarray:
+    """在音频前/后补静音：一次分配输出缓冲区，静音部分即为零初始化的切片"""
+    padded = np.zeros(silence_samples + len(audio), dtype=np.float32)
+    if position == "start":
+        padded[silence_samples:] = audio
+    else:
+        padded[:len(audio)] = audio
+    return padded
+
 async def apply_speed_and_silence(sentences: List[Sentence], sample_rate: int = 24000) -> None:
     """异步应用速度调整和添加静音到句子的音频数据中
     
@@ -53,9 +62,8 @@ async def apply_speed_and_silence(sentences: List[Sentence], sample_rate: int =
                         position="start"
                     )
                     
-                    # 创建静音数据并拼接
-                    leading_silence = np.zeros(silence_samples, dtype=np.float32)
-                    sentence.generated_audio = np.concatenate([leading_silence, audio_with_fade])
+                    # 一次分配并写入，静音部分无需单独创建
+                    sentence.generated_audio = _pad_silence(audio_with_fade, silence_samples, "start")
                     
                     # 记录操作结果
                     current_duration = (len(sentence.generated_audio) / sample_rate) * 1000
@@ -67,7 +75,8 @@ async def apply_speed_and_silence(sentences: List[Sentence], sample_rate: int =
                     logger.warning(f"[{task_id}] 句子 {sentence.sequence}: 调整速度至 {sentence.speed}")
                     
                     # 使用 librosa 时间伸缩调整速度
-                    audio_np = sentence.generated_audio.astype(np.float32)
+                    # 已是 float32 时不拷贝（asarray 仅在类型不符时转换）
+                    audio_np = np.asarray(sentence.generated_audio, dtype=np.float32)
                     
                     # 确保音频是单通道
                     if audio_np.ndim > 1:
@@ -102,9 +111,8 @@ async def apply_speed_and_silence(sentences: List[Sentence], sample_rate: int =
                         position="end"
                     )
                     
-                    # 创建静音数据并拼接到音频末尾
-                    silence = np.zeros(silence_samples, dtype=np.float32)
-                    sentence.generated_audio = np.concatenate([audio_with_fade, silence])
+                    # 一次分配并写入，静音部分无需单独创建
+                    sentence.generated_audio = _pad_silence(audio_with_fade, silence_samples, "end")
                     
                     # 记录操作结果
                     new_duration = (len(sentence.generated_audio) / sample_rate) * 1000
@@ -128,9 +136,8 @@ async def apply_speed_and_silence(sentences: List[Sentence], sample_rate: int =
                         position="end"
                     )
                     
-                    # 创建静音数据并拼接到音频末尾
-                    ending_silence = np.zeros(ending_silence_samples, dtype=np.float32)
-                    sentence.generated_audio = np.concatenate([audio_with_fade, ending_silence])
+                    # 一次分配并写入，静音部分无需单独创建
+                    sentence.generated_audio = _pad_silence(audio_with_fade, ending_silence_samples, "end")
                     
                     # 记录操作结果
                     new_duration = (len(sentence.generated_audio) / sample_rate) * 1000